@@ -0,0 +1,561 @@
+"""
+Offline end-to-end benchmark of cov_analysis.main().
+
+Local HTTP stand-ins replace the iGPT auth, inference, stream and embedding
+endpoints and the GitHub pull request endpoints, with configurable latency and
+error rate. Every scope runs main() in its own process on a synthetic git
+repository with N Coverity issues, and reports issues/sec, p50/p99 per-issue
+fix latency and peak RSS.
+
+With --startup_runs, it instead measures the start-up cost of cov_analysis.py:
+the wall time of fresh interpreters importing it or printing its --help, next to
+a bare interpreter and an import of pandas for reference.
+
+Example:
+    python benchmark.py --issues 500 --latency_ms 200 --error_rate 0.02 -- --max_inflight 16 --batch_size 4
+    python benchmark.py --startup_runs 20
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import atexit
+import shutil
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+import importlib.util
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+BENCH_REPO = "bench/repo"
+BENCH_PR_NUMBER = 1
+GITHUB_PAGE_SIZE = 100
+REPO_ROOT_PLACEHOLDER = "@REPO_ROOT@"
+
+ISSUE_TEMPLATES = [
+    (
+        "DC.STREAM_BUFFER", "    gets(buffer_{index});",
+        "Calling risky function gets(). The function cannot be used safely.",
+        "Use fgets() with the size of the buffer instead."
+    ),
+    (
+        "NULL_RETURNS", "    value_{index} = lookup_{index}(table);",
+        "Dereferencing a pointer that might be null when calling lookup.",
+        "Check the return value for null before using it."
+    ),
+    (
+        "UNINIT", "    total += count_{index};",
+        "Using uninitialized value count when calling sum.",
+        "Initialize count before its first use."
+    ),
+]
+
+def synthetic_tree(issue_count, file_count):
+    """
+    Returns (files, issues) of a deterministic synthetic C source tree.
+
+    files maps each relative path to its lines, issues lists one dict per finding
+    with its relative path, line number, checker and event texts.
+    """
+    files = {}
+    issues = []
+    file_count = max(1, min(file_count, issue_count))
+    for file_index in range(file_count):
+        path = f"src/module_{file_index}.c"
+        lines = ["#include <stdio.h>", "", f"void func_{file_index}(void)", "{"]
+        for index in range(file_index, issue_count, file_count):
+            checker, code, description, remediation = ISSUE_TEMPLATES[index % len(ISSUE_TEMPLATES)]
+            lines.append(code.format(index=index))
+            issues.append({
+                "index": index,
+                "path": path,
+                "line": len(lines),
+                "checker": checker,
+                "function": f"func_{file_index}",
+                "description": description,
+                "remediation": remediation
+            })
+        lines.append("}")
+        files[path] = lines
+    return files, issues
+
+def synthetic_report(issues, repo_root):
+    """
+    Returns a cov-format-errors --json-output-v9 report of the synthetic issues.
+    """
+    return {
+        "type": "Coverity issues",
+        "formatVersion": 9,
+        "suppressedIssueCount": 0,
+        "issues": [
+            {
+                "mergeKey": hashlib.md5(f"{issue['path']}:{issue['index']}".encode('utf-8')).hexdigest(),
+                "occurrenceCountForMK": 1,
+                "occurrenceNumberInMK": 1,
+                "referenceOccurrenceCountForMK": None,
+                "checkerName": issue["checker"],
+                "subcategory": "none",
+                "type": issue["checker"].lower(),
+                "subtype": "none",
+                "code-language": "c/c++",
+                "extra": "",
+                "domain": "STATIC_C",
+                "language": "C",
+                "mainEventFilePathname": os.path.join(repo_root, issue["path"]),
+                "strippedMainEventFilePathname": issue["path"],
+                "mainEventLineNumber": issue["line"],
+                "mainEventColumnNumber": 5,
+                "properties": {},
+                "functionDisplayName": issue["function"],
+                "functionMangledName": issue["function"],
+                "localStatus": None,
+                "ordered": True,
+                "events": [
+                    {
+                        "covLStrEventDescription": issue["description"],
+                        "eventDescription": issue["description"],
+                        "eventNumber": 1,
+                        "eventTreePosition": "1",
+                        "eventSet": 0,
+                        "eventTag": issue["checker"].lower(),
+                        "filePathname": os.path.join(repo_root, issue["path"]),
+                        "strippedFilePathname": issue["path"],
+                        "lineNumber": issue["line"],
+                        "columnNumber": 5,
+                        "main": True,
+                        "moreInformationId": None,
+                        "remediation": False,
+                        "events": None
+                    },
+                    {
+                        "covLStrEventDescription": issue["remediation"],
+                        "eventDescription": issue["remediation"],
+                        "eventNumber": 2,
+                        "eventTreePosition": "2",
+                        "eventSet": 0,
+                        "eventTag": "remediation",
+                        "filePathname": os.path.join(repo_root, issue["path"]),
+                        "strippedFilePathname": issue["path"],
+                        "lineNumber": issue["line"],
+                        "columnNumber": 5,
+                        "main": False,
+                        "moreInformationId": None,
+                        "remediation": True,
+                        "events": None
+                    }
+                ],
+                "stateOnServer": None,
+                "localTriage": None,
+                "checkerProperties": None
+            }
+            for issue in issues
+        ],
+        "desktopAnalysisSettings": None,
+        "error": None,
+        "warnings": []
+    }
+
+def pr_file_entries(files):
+    return [
+        {
+            "filename": path,
+            "status": "added",
+            "additions": len(lines),
+            "deletions": 0,
+            "changes": len(lines),
+            "patch": f"@@ -0,0 +1,{len(lines)} @@\n" + "\n".join(f"+{line}" for line in lines)
+        }
+        for path, lines in files.items()
+    ]
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the iGPT and GitHub endpoints used by cov_analysis.py.
+    """
+    daemon_threads = True
+
+    def __init__(self, files, latency, jitter, error_rate):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.pr_files = pr_file_entries(files)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def count(self, endpoint):
+        with self.lock:
+            self.counters[endpoint] = self.counters.get(endpoint, 0) + 1
+
+CODE_PATTERN = re.compile(r'Code with issue: (.*)')
+BATCH_ISSUE_PATTERN = re.compile(r'Id: (\d+)\nIssue: .*\nCode with issue: (.*)')
+
+def stand_in_fix(code):
+    return f"{code.strip()} /* fixed */"
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes, with Nagle every keep-alive
+    # response would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            return json.loads(body) if body else {}
+        except ValueError:
+            return {}
+
+    def _send_json(self, body, status=200, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _simulate(self, endpoint):
+        """
+        Sleeps for the configured latency, returns False after sending an injected error.
+        """
+        self.server.count(endpoint)
+        time.sleep(max(0.0, random.gauss(self.server.latency, self.server.jitter)))
+        if random.random() < self.server.error_rate:
+            self.server.count(f"{endpoint}_errors")
+            self._send_json({"error": "injected"}, status=503)
+            return False
+        return True
+
+    def _model_output(self, prompt):
+        batch_issues = BATCH_ISSUE_PATTERN.findall(prompt)
+        if batch_issues:
+            return json.dumps({"fixes": [{"id": int(index), "fix": stand_in_fix(code)} for index, code in batch_issues]})
+        match = CODE_PATTERN.search(prompt)
+        return json.dumps({"fix": stand_in_fix(match.group(1) if match else "")})
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path == f"/repos/{BENCH_REPO}/pulls":
+            self.server.count("github_pulls")
+            self._send_json([])
+        elif parts.path == f"/repos/{BENCH_REPO}/pulls/{BENCH_PR_NUMBER}/files":
+            self.server.count("github_files")
+            query = parse_qs(parts.query)
+            page = int(query.get('page', ['1'])[0])
+            per_page = int(query.get('per_page', [str(GITHUB_PAGE_SIZE)])[0])
+            files = self.server.pr_files[(page - 1) * per_page:page * per_page]
+            headers = {'ETag': f'"{page}-{len(self.server.pr_files)}"'}
+            if page * per_page < len(self.server.pr_files):
+                headers['Link'] = f'<{self.server.url}{parts.path}?per_page={per_page}&page={page + 1}>; rel="next"'
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                self.send_response(304)
+                self.send_header('ETag', headers['ETag'])
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self._send_json(files, headers=headers)
+        else:
+            self._send_json({"message": "Not Found"}, status=404)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        request = self._read_json()
+        if path == "/v1/auth/token":
+            self.server.count("auth")
+            self._send_json({"access_token": "bench-token", "expires_in": 3600})
+        elif path == "/generativeaiinference/v2":
+            if self._simulate("inference"):
+                prompt = request["conversation"][0]["content"]
+                self._send_json({"currentResponse": f"```json\n{self._model_output(prompt)}\n```"})
+        elif path == "/generativeaiinference/v2/stream":
+            if self._simulate("stream"):
+                output = self._model_output(request["conversation"][0]["content"])
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for start in range(0, len(output), 16):
+                        chunk = output[start:start + 16].encode('utf-8')
+                        self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                        self.wfile.flush()
+                    self.wfile.write(b'0\r\n\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stops reading once the fix is complete
+                    self.close_connection = True
+        elif path == "/generativeaiembedding/v1/embed":
+            if self._simulate("embed"):
+                vectors = []
+                for text in request.get("input", []):
+                    # Texts of the same checker land close together
+                    seed = int(hashlib.md5(text.split('\n')[0].encode('utf-8')).hexdigest(), 16)
+                    vectors.append({"embedding": [((seed >> shift) & 0xff) / 255.0 for shift in range(0, 128, 8)]})
+                self._send_json({"data": vectors})
+        elif path == f"/repos/{BENCH_REPO}/pulls":
+            self.server.count("github_create_pull")
+            self._send_json({"number": BENCH_PR_NUMBER}, status=201)
+        elif path == f"/repos/{BENCH_REPO}/pulls/{BENCH_PR_NUMBER}/reviews":
+            self.server.count("github_reviews")
+            self._send_json({"id": 1})
+        else:
+            self._send_json({"message": "Not Found"}, status=404)
+
+def git(repo_dir, command):
+    subprocess.run(f"git {command}", shell=True, cwd=repo_dir, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def create_workspace(work_dir, files, issues):
+    """
+    Creates the synthetic repository with a local bare origin, the v9 report and a
+    pipelines file whose only stage copies the report in place of a Coverity run.
+
+    Returns:
+        tuple: (repository path, pipelines file path)
+    """
+    origin_dir = os.path.join(work_dir, 'origin.git')
+    repo_dir = os.path.join(work_dir, 'repo')
+    subprocess.run(f"git init -q --bare {origin_dir}", shell=True, check=True)
+    os.makedirs(repo_dir)
+    git(repo_dir, "init -q -b main")
+    git(repo_dir, "config user.email bench@example.com")
+    git(repo_dir, "config user.name bench")
+    git(repo_dir, f"remote add origin {origin_dir}")
+    for path, lines in files.items():
+        file_path = os.path.join(repo_dir, path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as file:
+            file.write("\n".join(lines) + "\n")
+    git(repo_dir, "add -A")
+    git(repo_dir, "commit -q -m 'Synthetic sources'")
+
+    # Like a real capture, the report holds absolute paths of the tree it ran in, which may be a worktree
+    report_path = os.path.join(work_dir, 'synthetic_report.json')
+    with open(report_path, 'w') as report_file:
+        json.dump(synthetic_report(issues, REPO_ROOT_PLACEHOLDER), report_file)
+    commands_path = os.path.join(work_dir, 'bench_commands.yaml')
+    with open(commands_path, 'w') as commands_file:
+        commands_file.write(f"c:\n  report:\n    command: sed \"s#{REPO_ROOT_PLACEHOLDER}#$(pwd)#g\" {report_path} > {{report}}\n")
+    return repo_dir, commands_path
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def run_scope(args, main_args):
+    """
+    Runs cov_analysis.main() once in this process and prints its metrics as JSON.
+    """
+    work_dir = tempfile.mkdtemp(prefix=f'coverity-bench-{args.scope}-')
+    # Registered before main() registers its own exit handlers, so it runs after them
+    atexit.register(shutil.rmtree, work_dir, ignore_errors=True)
+    # Keep token, response and idir caches out of the user's home
+    os.environ['HOME'] = work_dir
+    os.environ.update({'CLIENT_ID': 'bench', 'CLIENT_SECRET': 'bench', 'GH_TOKEN': 'bench'})
+    os.environ['no_proxy'] = os.environ['NO_PROXY'] = '127.0.0.1,localhost'
+
+    files, issues = synthetic_tree(args.issues, args.files)
+    repo_dir, commands_path = create_workspace(work_dir, files, issues)
+    os.chdir(repo_dir)
+
+    sys.path.insert(0, script_dir)
+    import cov_analysis
+    cov_analysis.AUTH_URL = f"{args.server}/v1/auth/token"
+    cov_analysis.GPT_API_URL = f"{args.server}/generativeaiinference/v2"
+    cov_analysis.GPT_STREAM_API_URL = f"{args.server}/generativeaiinference/v2/stream"
+    cov_analysis.EMBED_API_URL = f"{args.server}/generativeaiembedding/v1/embed"
+    cov_analysis.GITHUB_API_URL = args.server
+
+    # Per-issue latency is the duration of the fix call that produced the issue's fix
+    latencies = []
+    latencies_lock = threading.Lock()
+    timing = threading.local()
+
+    def timed(function, issue_count):
+        def wrapper(*call_args, **call_kwargs):
+            if getattr(timing, "active", False):
+                return function(*call_args, **call_kwargs)
+            timing.active = True
+            start = time.perf_counter()
+            try:
+                return function(*call_args, **call_kwargs)
+            finally:
+                timing.active = False
+                elapsed = time.perf_counter() - start
+                with latencies_lock:
+                    latencies.extend([elapsed] * issue_count(call_args))
+        return wrapper
+
+    cov_analysis.generate_fix = timed(cov_analysis.generate_fix, lambda call_args: 1)
+    cov_analysis.generate_batch_fixes = timed(cov_analysis.generate_batch_fixes, lambda call_args: len(call_args[1]))
+
+    sys.argv = [
+        'cov_analysis.py', '--scan_scope', args.scope, '--jira_id', 'BENCH-1', '--github_repo', BENCH_REPO,
+        '--language', 'c', '--coverity_commands', commands_path, '--disable_idir_cache',
+        '--llm_cache_dir', os.path.join(work_dir, 'llm_cache'),
+        '--stage_log_dir', os.path.join(work_dir, 'logs'), '--timings_file', os.path.join(work_dir, 'timings.json')
+    ] + (['--pr_number', str(BENCH_PR_NUMBER)] if args.scope == 'pr' else []) + main_args
+    logging.getLogger().setLevel(logging.WARNING)
+
+    start = time.perf_counter()
+    try:
+        cov_analysis.main()
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise
+    wall_time = time.perf_counter() - start
+
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "scope": args.scope,
+        "issues": args.issues,
+        "llm_fixed_issues": len(latencies),
+        "wall_seconds": wall_time,
+        "issues_per_second": args.issues / wall_time if wall_time else 0.0,
+        "latency_p50_ms": percentile(latencies, 0.50) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_kb / 1024
+    }))
+
+STARTUP_COMMANDS = [
+    ("python -c pass", ["-c", "pass"]),
+    ("import pandas (reference)", ["-c", "import pandas"]),
+    ("import cov_analysis", ["-c", "import cov_analysis"]),
+    ("cov_analysis.py --help", ["cov_analysis.py", "--help"])
+]
+
+def run_startup(runs):
+    """
+    Launches every startup command runs times in a fresh interpreter and returns
+    their wall times. One unmeasured launch first writes the bytecode caches.
+    """
+    results = []
+    for name, arguments in STARTUP_COMMANDS:
+        if arguments[-1] == "import pandas" and importlib.util.find_spec("pandas") is None:
+            continue
+        command = [sys.executable] + arguments
+        subprocess.run(command, cwd=script_dir, check=True, stdout=subprocess.DEVNULL)
+        wall_times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=script_dir, check=True, stdout=subprocess.DEVNULL)
+            wall_times.append(time.perf_counter() - start)
+        results.append({
+            "command": name,
+            "runs": runs,
+            "median_ms": percentile(wall_times, 0.50) * 1000,
+            "min_ms": min(wall_times) * 1000,
+            "max_ms": max(wall_times) * 1000
+        })
+    return results
+
+def format_startup_results(results):
+    header = ["Command", "Runs", "Median (ms)", "Min (ms)", "Max (ms)"]
+    rows = [
+        [result["command"], result["runs"], f"{result['median_ms']:.1f}", f"{result['min_ms']:.1f}", f"{result['max_ms']:.1f}"]
+        for result in results
+    ]
+    return format_table(header, rows)
+
+def format_results(results):
+    header = ["Scope", "Issues", "LLM fixes", "Wall (s)", "Issues/s", "p50 (ms)", "p99 (ms)", "Peak RSS (MB)"]
+    rows = [
+        [
+            result["scope"], result["issues"], result["llm_fixed_issues"], f"{result['wall_seconds']:.2f}",
+            f"{result['issues_per_second']:.1f}", f"{result['latency_p50_ms']:.1f}",
+            f"{result['latency_p99_ms']:.1f}", f"{result['peak_rss_mb']:.1f}"
+        ]
+        for result in results
+    ]
+    return format_table(header, rows)
+
+def format_table(header, rows):
+    widths = [max(len(str(row[column])) for row in [header] + rows) for column in range(len(header))]
+    lines = [" | ".join(str(value).ljust(width) for value, width in zip(row, widths)) for row in [header] + rows]
+    lines.insert(1, "-+-".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Offline benchmark of cov_analysis.py against local iGPT and GitHub stand-ins. '
+                    'Arguments after -- are passed to cov_analysis.py.'
+    )
+    parser.add_argument('--issues', type=int, default=200, help='Number of synthetic Coverity issues')
+    parser.add_argument('--files', type=int, default=20, help='Number of synthetic source files the issues are spread over')
+    parser.add_argument('--scopes', nargs='+', choices=['repo', 'pr'], default=['repo', 'pr'], help='Scan scopes to benchmark')
+    parser.add_argument('--latency_ms', type=float, default=50, help='Mean latency of the iGPT stand-in endpoints')
+    parser.add_argument('--jitter_ms', type=float, default=10, help='Standard deviation of the stand-in latency')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='Fraction of iGPT stand-in requests answered with 503')
+    parser.add_argument('--startup_runs', type=int, help='Measure the start-up time of cov_analysis.py over this many launches instead of running a scan')
+    parser.add_argument('--output', help='File receiving the results as JSON')
+    parser.add_argument('--scope', choices=['repo', 'pr'], help=argparse.SUPPRESS)
+    parser.add_argument('--server', help=argparse.SUPPRESS)
+    argv = sys.argv[1:]
+    main_args = []
+    if '--' in argv:
+        main_args = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    args = parser.parse_args(argv)
+
+    if args.scope:
+        run_scope(args, main_args)
+        return
+
+    if args.startup_runs:
+        startup_results = run_startup(args.startup_runs)
+        print(format_startup_results(startup_results))
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump({"startup": startup_results}, output_file, indent=4)
+        return
+
+    files, _ = synthetic_tree(args.issues, args.files)
+    server = StandInServer(files, args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Stand-in endpoints listening on {server.url}")
+
+    results = []
+    try:
+        for scope in args.scopes:
+            logging.info(f"Benchmarking {scope} scope with {args.issues} issues...")
+            command = [
+                sys.executable, os.path.abspath(__file__), '--scope', scope, '--server', server.url,
+                '--issues', str(args.issues), '--files', str(args.files), '--'
+            ] + main_args
+            result = subprocess.run(command, stdout=subprocess.PIPE, universal_newlines=True)
+            if result.returncode != 0:
+                logging.error(f"Benchmark of {scope} scope failed with exit code {result.returncode}")
+                sys.exit(1)
+            results.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    finally:
+        server.shutdown()
+
+    print(format_results(results))
+    logging.info(f"Stand-in requests: {server.counters}")
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({"results": results, "requests": server.counters}, output_file, indent=4)
+
+if __name__ == "__main__":
+    main()
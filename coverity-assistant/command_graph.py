@@ -0,0 +1,118 @@
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# {{ and }} are the str.format escapes older command files use for literal braces
+PLACEHOLDER_PATTERN = re.compile(r'\{\{|\}\}|(?<!\$)\{(\w+)\}')
+
+def render_command(command, variables):
+    """
+    Replaces the {name} placeholders of command that are keys of variables.
+
+    Any other brace, e.g. a shell ${VAR}, an awk block or a find -exec {}, is
+    passed to the shell unchanged.
+    """
+    if not isinstance(command, str):
+        raise ValueError(f"Command is not a string: {command!r}")
+
+    def substitute(match):
+        if match.group(1) is None:
+            return match.group(0)[0]
+        if match.group(1) in variables:
+            return str(variables[match.group(1)])
+        return match.group(0)
+    return PLACEHOLDER_PATTERN.sub(substitute, command)
+
+def load_command_graph(pipelines, pipeline_name, variables, prefix=None):
+    """
+    Builds the stage graph of one pipeline from coverity_commands.yaml.
+
+    A pipeline is either a mapping of stage name to {command, needs, timeout} or, in the
+    legacy format, a plain list of commands that run one after the other.
+    Commands are rendered with render_command using variables.
+
+    Args:
+        pipelines (dict): The parsed coverity_commands.yaml.
+        pipeline_name (str): The pipeline to load, e.g. 'c' or 'python_pr'.
+        variables (dict): Values for the {placeholders} of the commands.
+        prefix (str): Prepended to stage names so several pipelines can share one graph.
+
+    Returns:
+        dict: Stage name to {"command": str, "needs": list}, or None if the pipeline does not exist.
+    """
+    stages = pipelines.get(pipeline_name)
+    if stages is None:
+        return None
+    if isinstance(stages, list):
+        stages = {
+            f"step{index}": {"command": command, "needs": [f"step{index - 1}"] if index else []}
+            for index, command in enumerate(stages)
+        }
+
+    prefix = f"{prefix}:" if prefix else ""
+    graph = {}
+    for name, stage in stages.items():
+        if isinstance(stage, str):
+            stage = {"command": stage}
+        needs = stage.get("needs") or []
+        if isinstance(needs, str):
+            needs = [needs]
+        for need in needs:
+            if need not in stages:
+                raise ValueError(f"Stage {name} of {pipeline_name} needs unknown stage {need}")
+        graph[f"{prefix}{name}"] = {
+            "command": render_command(stage["command"], variables),
+            "needs": [f"{prefix}{need}" for need in needs],
+            "timeout": stage.get("timeout")
+        }
+    return graph
+
+def uses_variable(pipelines, pipeline_name, variable):
+    stages = pipelines.get(pipeline_name) or []
+    commands = stages if isinstance(stages, list) else [
+        stage if isinstance(stage, str) else stage["command"] for stage in stages.values()
+    ]
+    return any(f"{{{variable}}}" in command for command in commands)
+
+def run_command_graph(graph, run, cancel=None):
+    """
+    Runs every stage of graph as soon as all the stages it needs have finished.
+
+    Independent stages run concurrently. The first failing stage, or an interrupt
+    such as Ctrl-C, stops any new stage from starting and calls cancel to stop the
+    stages still running, then the exception is re-raised.
+
+    Args:
+        graph (dict): Stage name to {"command": str, "needs": list, "timeout": seconds}.
+        run (callable): Executes one command as run(command, stage=name, timeout=timeout).
+        cancel (callable): Optional, stops the commands still running after a failure or interrupt.
+    """
+    remaining = dict(graph)
+    done = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(graph))) as executor:
+        try:
+            while remaining or running:
+                ready = [name for name, stage in remaining.items() if all(need in done for need in stage["needs"])]
+                for name in ready:
+                    stage = remaining.pop(name)
+                    logging.info(f"Starting stage {name}")
+                    running[executor.submit(run, stage["command"], stage=name, timeout=stage.get("timeout"))] = name
+                if not running:
+                    raise ValueError(f"Stages with unsatisfiable dependencies: {sorted(remaining)}")
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        logging.error(f"Stage {name} failed")
+                    future.result()
+                    logging.info(f"Finished stage {name}")
+                    done.add(name)
+        except BaseException:
+            # Also reached on Ctrl-C: the commands run in their own sessions and do not
+            # get the SIGINT, so they are stopped here before the pool waits for them
+            if cancel and running:
+                cancel()
+            raise
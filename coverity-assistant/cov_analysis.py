@@ -1,4 +1,6 @@
 import os
+import re
+import atexit
 import subprocess
 import json
 import sys
@@ -6,16 +8,36 @@ import logging
 import requests
 import time
 import argparse
+import functools
+import hashlib
+import itertools
 import shutil
-import yaml
+import shlex
+import signal
+import tempfile
+import threading
 from datetime import datetime
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from response_cache import ResponseCache
+from http_sessions import get_session, configure_pools
+from request_scheduler import configure_scheduler, get_scheduler
+from token_manager import TokenManager
+from issue_store import IssueStore
+from coverity_report import Issue, iter_report_issues
+from source_cache import SourceCache
+from command_graph import load_command_graph, run_command_graph, uses_variable
+from idir_cache import IdirCache
+from text_table import markdown_table
+import tracing
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Get the absolute path of the current script
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
+# Shared per-run cache of source file lines
+source_cache = SourceCache()
+
 def set_environment_variables():
     try:
         logging.info("Setting environment variables...")
@@ -27,117 +49,271 @@ def set_environment_variables():
         logging.error(f"Error setting environment variables: {e}")
         sys.exit(1)
 
-def run_command(command):
+# Where stage output is teed and the default stage timeout, set from the command line in main()
+command_settings = {"log_dir": None, "timeout": None}
+command_timings = []
+running_processes = set()
+command_lock = threading.Lock()
+
+def run_command(command, stage=None, timeout=None):
+    """
+    Runs a shell command, streaming its output line by line to the log.
+
+    Output of named stages is also teed to <log_dir>/<stage>.log. Wall time, CPU
+    time and peak RSS of every command are appended to command_timings. The command
+    is killed when it runs longer than timeout seconds (or the default stage
+    timeout), or when cancel_running_commands is called.
+    """
+    timeout = timeout or command_settings["timeout"]
+    stage_log = None
     try:
         logging.info(f"Running command: {command}")
-        result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-        if result.returncode != 0:
+        if stage and command_settings["log_dir"]:
+            os.makedirs(command_settings["log_dir"], exist_ok=True)
+            stage_log_path = os.path.join(command_settings["log_dir"], f"{stage.replace(':', '_')}.log")
+            stage_log = open(stage_log_path, 'a')
+            stage_log.write(f"$ {command}\n")
+        start_wall = time.monotonic()
+        process = subprocess.Popen(
+            command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            universal_newlines=True, start_new_session=True
+        )
+        with command_lock:
+            running_processes.add(process)
+        timer = None
+        timed_out = threading.Event()
+        if timeout:
+            def kill_on_timeout():
+                timed_out.set()
+                terminate_process(process)
+            timer = threading.Timer(timeout, kill_on_timeout)
+            timer.daemon = True
+            timer.start()
+        try:
+            for line in process.stdout:
+                logging.info(line.rstrip('\n'))
+                if stage_log:
+                    stage_log.write(line)
+            process.stdout.close()
+            cpu_time, peak_rss_kb = None, None
+            if hasattr(os, 'wait4'):
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                cpu_time = usage.ru_utime + usage.ru_stime
+                # Includes reaped descendants, and is never below this process's RSS at fork time
+                peak_rss_kb = usage.ru_maxrss
+            else:
+                process.wait()
+        except BaseException:
+            # The command runs in its own session, so a Ctrl-C of ours never reaches it
+            terminate_process(process)
+            raise
+        finally:
+            if timer:
+                timer.cancel()
+            with command_lock:
+                running_processes.discard(process)
+        wall_time = time.monotonic() - start_wall
+        with command_lock:
+            command_timings.append({
+                "stage": stage,
+                "command": command,
+                "returncode": process.returncode,
+                "wall_time": round(wall_time, 3),
+                "cpu_time": round(cpu_time, 3) if cpu_time is not None else None,
+                "peak_rss_kb": peak_rss_kb,
+                "timed_out": timed_out.is_set()
+            })
+        # Named stages are Coverity commands, the others are mostly git
+        category = "coverity" if stage else "git" if command.startswith("git") else "command"
+        tracing.record(stage or " ".join(command.split()[:2]), category, wall_time, command=command, returncode=process.returncode)
+        if process.returncode != 0:
+            if timed_out.is_set():
+                logging.error(f"Command timed out after {timeout} seconds: {command}")
             logging.error(f"Error running command: {command}")
-            logging.error(result.stderr)
             sys.exit(1)
-        else:
-            logging.info(result.stdout)
-        return result
+        return subprocess.CompletedProcess(command, process.returncode)
     except Exception as e:
         logging.error(f"Exception occurred while running command: {command}")
         logging.error(e)
         sys.exit(1)
+    finally:
+        if stage_log:
+            stage_log.close()
 
-def get_access_token():
-    client_id = os.getenv('CLIENT_ID')
-    client_secret = os.getenv('CLIENT_SECRET')
-    if not client_id or not client_secret:
-        logging.error("CLIENT_ID and CLIENT_SECRET environment variables must be set.")
-        sys.exit(1)
+def terminate_process(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError, AttributeError):
+        process.terminate()
+
+def cancel_running_commands():
+    with command_lock:
+        processes = list(running_processes)
+    for process in processes:
+        logging.info(f"Cancelling command: {process.args}")
+        terminate_process(process)
+
+def write_command_timings(timings_file):
+    try:
+        with command_lock:
+            timings = list(command_timings)
+        with open(timings_file, 'w') as file:
+            json.dump({"commands": timings}, file, indent=4)
+        logging.info(f"Command timings written to {timings_file}")
+    except Exception as e:
+        logging.error(f"Error writing command timings to {timings_file}: {e}")
+
+def generate_timings_table():
+    with command_lock:
+        timings = [timing for timing in command_timings if timing["stage"]]
+    if not timings:
+        return None
+    rows = [f"{'Stage':<30} {'Wall (s)':>10} {'CPU (s)':>10} {'Peak RSS (MB)':>14}"]
+    for timing in timings:
+        cpu_time = f"{timing['cpu_time']:.2f}" if timing["cpu_time"] is not None else "n/a"
+        peak_rss = f"{timing['peak_rss_kb'] / 1024:.1f}" if timing["peak_rss_kb"] is not None else "n/a"
+        rows.append(f"{timing['stage']:<30} {timing['wall_time']:>10.2f} {cpu_time:>10} {peak_rss:>14}")
+    return "\n".join(rows)
 
+STAGE_CATEGORIES = ("coverity", "llm", "bookkeeping", "git", "github", "command")
+
+def generate_stage_breakdown_table():
+    """
+    Returns the wall time of the run spent in each span category. Stages overlap
+    where they run in parallel, e.g. fix generation while the report is parsed.
+    """
+    breakdown = tracing.tracer.breakdown()
+    if not breakdown:
+        return None
+    elapsed = tracing.tracer.elapsed()
+    categories = [category for category in STAGE_CATEGORIES if category in breakdown]
+    categories += sorted(category for category in breakdown if category not in STAGE_CATEGORIES)
+    rows = [f"{'Stage':<30} {'Wall (s)':>10} {'% of run':>10} {'Spans':>8}"]
+    for category in categories:
+        entry = breakdown[category]
+        percentage = entry["seconds"] / elapsed * 100 if elapsed > 0 else 0
+        rows.append(f"{category:<30} {entry['seconds']:>10.2f} {percentage:>9.1f}% {entry['spans']:>8}")
+    return "\n".join(rows)
+
+def write_trace_files(trace_file, metrics_file):
+    """
+    Writes the JSON trace and the Prometheus textfile. Registered with atexit so
+    runs that exit early are traced as well.
+    """
+    counters = {f"llm_scheduler_{name}": value for name, value in get_scheduler().stats().items()}
+    for path, write in ((trace_file, tracing.tracer.write_trace), (metrics_file, tracing.tracer.write_prometheus)):
+        if not path:
+            continue
+        try:
+            write(path, counters)
+        except Exception as e:
+            logging.error(f"Error writing {path}: {e}")
+
+AUTH_URL = "https://apis.intel.com/v1/auth/token"
+GPT_API_URL = "https://apis.intel.com/generativeaiinference/v2"
+GPT_STREAM_API_URL = "https://apis.intel.com/generativeaiinference/v2/stream"
+GITHUB_API_URL = "https://api.github.com"
+
+def request_access_token(client_id, client_secret):
     data = {
         'grant_type': 'client_credentials'
     }
     headers = {
         'Content-Type': 'application/x-www-form-urlencoded'
     }
-    try:
-        response = requests.post(
-            "https://apis.intel.com/v1/auth/token",
+    with tracing.span("auth_request", "llm"):
+        response = get_scheduler().request(
+            get_session(AUTH_URL), 'post', AUTH_URL,
             data=data,
             headers=headers,
-            auth=(client_id, client_secret),
-            proxies=None
+            auth=(client_id, client_secret)
         )
-        response.raise_for_status()
-        response_json = response.json()
-        logging.debug("%s", response_json)
-        access_token_expires_on = int(response_json.get('expires_in')) + time.time() - 60
-        access_token = response_json.get('access_token')
-        if not access_token:
-            logging.error("Failed to obtain access token.")
-            sys.exit(1)
-        logging.info("Access token obtained.")
-        return access_token
-    except requests.exceptions.RequestException as e:
+    response.raise_for_status()
+    response_json = response.json()
+    access_token_expires_on = int(response_json.get('expires_in')) + time.time() - 60
+    access_token = response_json.get('access_token')
+    if not access_token:
+        raise ValueError("No access_token in the auth response.")
+    logging.info("Access token obtained.")
+    return access_token, access_token_expires_on
+
+def get_access_token():
+    """
+    Returns a TokenManager holding a valid iGPT access token.
+
+    The token is shared with other jobs on this host through the token cache and
+    is refreshed in the background before it expires.
+    """
+    client_id = os.getenv('CLIENT_ID')
+    client_secret = os.getenv('CLIENT_SECRET')
+    if not client_id or not client_secret:
+        logging.error("CLIENT_ID and CLIENT_SECRET environment variables must be set.")
+        sys.exit(1)
+
+    token_manager = TokenManager(
+        functools.partial(request_access_token, client_id, client_secret),
+        f"{AUTH_URL}:{client_id}"
+    )
+    try:
+        token_manager.get_token()
+    except (requests.exceptions.RequestException, ValueError) as e:
         logging.error(f"Failed to get access token: {e}")
         sys.exit(1)
+    return token_manager
 
-def read_and_format_issues(json_report_file):
+def read_issues(json_report_file):
+    """
+    Streams the issues of a v9 JSON report as Issue records.
+
+    The report is parsed incrementally, so issues are yielded while the rest of
+    the report is still being read.
+    """
+    issue_count = 0
     try:
-        with open(json_report_file, 'r') as file:
-            data = json.load(file)
-            issues = data.get('issues', [])
-            if not issues:
-                logging.info("No issues found in the JSON report.")
-                return []
-
-            formatted_issues = []
-            for issue in issues:
-                file_path = issue.get('mainEventFilePathname')
-                line_number = issue.get('mainEventLineNumber')
-                issue_type = issue.get('checkerName')
-                language = issue.get('language')
-                events = issue.get('events', [])
-                event_descriptions = []
-                for event in events:
-                    description = event.get('eventDescription')
-                    if event.get('remediation') == True:
-                        description = f"Recommended_Remediation: {description}"
-                    event_descriptions.append(description)
-                formatted_issue = f"{file_path}:{line_number}:{issue_type}:{language}:{' '.join(event_descriptions)}"
-                formatted_issues.append(formatted_issue)
-            return formatted_issues
+        report_issues = tracing.traced_iter(iter_report_issues(json_report_file), "parse_issue", "bookkeeping")
+        for issue in report_issues:
+            issue_count += 1
+            yield Issue.from_v9(issue)
     except Exception as e:
-        logging.error(f"Error reading and formatting issues: {e}")
+        logging.error(f"Error reading issues: {e}")
         sys.exit(1)
+    if not issue_count:
+        logging.info("No issues found in the JSON report.")
 
 def get_line_from_file(file_path, line_number):
     try:
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
-            if line_number <= len(lines):
-                return lines[line_number - 1].strip()
-            else:
-                logging.error(f"Line number {line_number} exceeds the number of lines in {file_path}")
-                return None
+        line = source_cache.get_line(file_path, line_number)
+        if line is not None:
+            return line.strip()
+        else:
+            logging.error(f"Line number {line_number} exceeds the number of lines in {file_path}")
+            return None
     except Exception as e:
         logging.error(f"Error reading line {line_number} from file {file_path}: {e}")
         return None
 
-def call_gpt_api(access_token, prompt_input):
-    api_url = "https://apis.intel.com/generativeaiinference/v2"
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'Content-Type': 'application/json'
-    }
-    data = {
-        "options": {
-            "temperature": 1,
-            "top_p": 0.95,
-            "frequency_penalty": 0,
-            "presence_penalty": 0,
-            "max_tokens": 1000,
-            "stop": None,
-            "allowmodelfallback": True,
-            "includeConversation": True,
-            "model": "gpt-4o"
-        },
+GPT_OPTIONS = {
+    "temperature": 1,
+    "top_p": 0.95,
+    "frequency_penalty": 0,
+    "presence_penalty": 0,
+    "max_tokens": 1000,
+    "stop": None,
+    "allowmodelfallback": True,
+    "includeConversation": True,
+    "model": "gpt-4o"
+}
+
+# Completion limit of the model, batch requests must not ask for more
+GPT_MAX_OUTPUT_TOKENS = 4096
+
+# Whether single issue fixes use the streaming endpoint, set from the command line in main()
+gpt_settings = {"stream": False}
+
+def gpt_request_data(prompt_input, options=None):
+    return {
+        "options": options if options else GPT_OPTIONS,
         "correlationId": "inference-test0905-2",
         "conversation": [
             {
@@ -146,48 +322,531 @@ def call_gpt_api(access_token, prompt_input):
             }
         ]
     }
-    try:
-        response = requests.post(api_url, headers=headers, json=data)
+
+def count_llm_request(endpoint, data, response_bytes=None, response_json=None):
+    """
+    Counts one LLM request with its request and response sizes, and the tokens
+    reported in an OpenAI style usage field of the response, if any.
+    """
+    tracing.count("llm_requests", endpoint=endpoint)
+    tracing.count("llm_request_bytes", len(json.dumps(data)), endpoint=endpoint)
+    if response_bytes is not None:
+        tracing.count("llm_response_bytes", response_bytes, endpoint=endpoint)
+    usage = response_json.get("usage") if isinstance(response_json, dict) else None
+    if isinstance(usage, dict):
+        for kind in ("prompt", "completion"):
+            if isinstance(usage.get(f"{kind}_tokens"), int):
+                tracing.count("llm_tokens", usage[f"{kind}_tokens"], endpoint=endpoint, kind=kind)
+
+def count_response_chunks(chunks, endpoint):
+    for chunk in chunks:
+        tracing.count("llm_response_bytes", len(chunk), endpoint=endpoint)
+        yield chunk
+
+def request_gpt_api(access_token, prompt_input, options=None):
+    """
+    Calls the GPT API and returns the response JSON. Errors left after the
+    scheduler's retries are raised as requests exceptions.
+    """
+    api_url = GPT_API_URL
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+    data = gpt_request_data(prompt_input, options)
+    with tracing.span("gpt_request", "llm"):
+        response = get_scheduler().request(get_session(api_url), 'post', api_url, headers=headers, json=data)
         response.raise_for_status()
-        return response.json()
+        response_json = response.json()
+    count_llm_request("gpt", data, len(response.content), response_json)
+    return response_json
+
+def call_gpt_api(access_token, prompt_input, options=None):
+    try:
+        return request_gpt_api(access_token, prompt_input, options)
     except requests.exceptions.RequestException as e:
-        logging.error(f"Failed to call GPT API: {e}")
+        logging.error(f"Failed to call GPT API after retries: {e}")
         sys.exit(1)
 
-def replace_suggested_fix(file_path, line_number, fix_value):
+def call_gpt_api_stream(access_token, prompt_input, field='fix', options=None):
+    """
+    Streams the GPT response and stops reading as soon as the string value of field is complete.
+
+    Closing the response early drops the rest of an overlong generation.
+
+    Returns:
+        tuple: (field value or None if it never completed, text received so far)
+    """
+    api_url = GPT_STREAM_API_URL
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+    # Only needed with --stream_fixes, imported here to keep it off the startup path
+    from llm_stream import iter_stream_text, JsonStringFieldParser
+    data = gpt_request_data(prompt_input, options)
+    parser = JsonStringFieldParser(field)
+    received = []
     try:
-        # Read the file content
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
+        with tracing.span("gpt_stream_request", "llm") as attributes:
+            with get_scheduler().request(get_session(api_url), 'post', api_url, headers=headers, json=data, stream=True) as response:
+                response.raise_for_status()
+                count_llm_request("gpt_stream", data)
+                for text in iter_stream_text(count_response_chunks(response.iter_content(chunk_size=None), "gpt_stream")):
+                    received.append(text)
+                    if parser.feed(text):
+                        break
+            attributes["stopped_early"] = parser.done
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to call GPT streaming API after retries: {e}")
+        sys.exit(1)
+    return parser.value, ''.join(received)
 
-        # Get the original line
-        original_line = lines[line_number - 1]
-        leading_spaces = len(original_line) - len(original_line.lstrip())  # Calculate leading spaces
+EMBED_API_URL = "https://apis.intel.com/generativeaiembedding/v1/embed"
+EMBED_MODEL = "text-embedding-3-small"
+EMBED_CHUNK_SIZE = 64
 
-        # Apply the same indentation to the suggested fix
-        indented_fix_lines = [' ' * leading_spaces + line for line in fix_value.split('\n')]
+def call_embedding_api(access_token, texts):
+    """
+    Returns one embedding vector per text. Errors are raised to the caller, which
+    can do without embeddings.
+    """
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+    data = {
+        "model": EMBED_MODEL,
+        "input": texts
+    }
+    with tracing.span("embedding_request", "llm", texts=len(texts)):
+        response = get_scheduler().request(get_session(EMBED_API_URL), 'post', EMBED_API_URL, headers=headers, json=data)
+        response.raise_for_status()
+        response_json = response.json()
+    count_llm_request("embedding", data, len(response.content), response_json)
+    return [entry["embedding"] for entry in response_json["data"]]
+
+def embed_texts(token_manager, texts):
+    vectors = []
+    for start in range(0, len(texts), EMBED_CHUNK_SIZE):
+        vectors.extend(call_embedding_api(token_manager.get_token(), texts[start:start + EMBED_CHUNK_SIZE]))
+    return vectors
+
+# Bump whenever PROMPT_TEMPLATE changes so cached fixes from the old prompt are not reused
+PROMPT_TEMPLATE_VERSION = 1
+
+PROMPT_TEMPLATE = """
+Issue: {issue}
+Code with issue: {code_with_issue}
+{rerun_fix}
+Read the Coverity issue report and the code_with_issue. Act on the following:
+1. Generate a precise fix code snippet for fixing the issue while maintaining the original code style and indentation.
+2. Keep the fix relevant to the existing code without making assumptions beyond the provided context.
+3. Output should follow the structured JSON format with 'fix',
+4. Do not add unnecessary information. example: fix: "int x = 0; // Initialize x to 0 to avoid undefined behavior"
+5. The code must be functional and compilable in case of langauges that needs compilations
+6. Validate the generated JSON output to ensure correctness and proper formatting. Verify indentation and structure consistency and do not introduce unrelated changes.
+"""
+
+BATCH_PROMPT_TEMPLATE = """
+The following Coverity issues were reported in the same function. Each issue has an id.
+{issues}
+Read each Coverity issue report and its code_with_issue. Act on the following:
+1. Generate a precise fix code snippet for every issue while maintaining the original code style and indentation.
+2. Keep each fix relevant to its own code_with_issue without making assumptions beyond the provided context.
+3. Output should follow the structured JSON format {{"fixes": [{{"id": <issue id>, "fix": "<fix code>"}}]}} with one entry per issue id.
+4. Do not add unnecessary information.
+5. The code must be functional and compilable in case of langauges that needs compilations
+6. Validate the generated JSON output to ensure correctness and proper formatting. Verify indentation and structure consistency and do not introduce unrelated changes.
+"""
+
+BATCH_ISSUE_TEMPLATE = """
+Id: {id}
+Issue: {issue}
+Code with issue: {code_with_issue}
+{rerun_fix}"""
+
+def fix_cache_key(response_cache, issue, line_content, rerun_fix):
+    return response_cache.make_key(
+        issue.merge_key, issue.checker, f"{line_content}\n{rerun_fix}", PROMPT_TEMPLATE_VERSION, GPT_OPTIONS
+    )
+
+JSON_FENCE_PATTERN = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+
+def parse_gpt_json(gpt_response):
+    currentResponse = gpt_response.get('currentResponse')
+    logging.info(f"Suggestion fix: %s", currentResponse)
+    currentResponse = JSON_FENCE_PATTERN.sub('', currentResponse)
+    return json.loads(currentResponse)
+
+def generate_fix(token_manager, issue, line_content, rerun_fix, response_cache=None, check_cache=True):
+    """
+    Builds the prompt for a single issue, calls the GPT API and parses the suggested fix.
+    Fixes already in the response cache are returned without calling the GPT API.
 
-        # Replace the original line with the indented suggested fix
-        lines[line_number - 1] = '\n'.join(indented_fix_lines) + '\n'
+    Returns:
+        str: The 'fix' value returned by the model, or None when its reply cannot be parsed.
+    """
+    with tracing.span("fix_issue", "llm", merge_key=issue.merge_key) as attributes:
+        cache_key = None
+        if response_cache:
+            cache_key = fix_cache_key(response_cache, issue, line_content, rerun_fix)
+            cached_fix = response_cache.get(cache_key) if check_cache else None
+            if cached_fix is not None:
+                logging.info(f"Using cached fix for issue {issue.merge_key}: {cached_fix}")
+                attributes["cached"] = True
+                return cached_fix
+
+        prompt_input = PROMPT_TEMPLATE.format(issue=issue, code_with_issue=line_content, rerun_fix=rerun_fix)
+        prompt_input = f'"{prompt_input}"'
+        logging.info(f"Prompt input: {prompt_input}")
+
+        # Call the GPT API
+        try:
+            if gpt_settings["stream"]:
+                fix_value, response_text = call_gpt_api_stream(token_manager.get_token(), prompt_input)
+                if fix_value is None:
+                    # The fix is not a plain JSON string, parse the whole response instead
+                    logging.info("GPT API streamed response:")
+                    logging.info(response_text)
+                    fix_value = parse_gpt_json({'currentResponse': response_text})["fix"]
+            else:
+                gpt_response = call_gpt_api(token_manager.get_token(), prompt_input)
+                logging.info("GPT API response:")
+                logging.info(json.dumps(gpt_response, indent=4))
+                data = parse_gpt_json(gpt_response)
+                fix_value = data["fix"]
+            if not isinstance(fix_value, str):
+                raise TypeError(f"fix is a {type(fix_value).__name__}, not a string")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            # One malformed reply only leaves its own issue unfixed
+            logging.error(f"Failed to parse the suggested fix for issue {issue.merge_key}, leaving it unfixed: {e}")
+            attributes["parse_error"] = True
+            return None
+        logging.info(fix_value)
+        if cache_key:
+            response_cache.put(cache_key, fix_value)
+        return fix_value
+
+def generate_batch_fixes(token_manager, batch, response_cache=None):
+    """
+    Generates fixes for several issues of the same file and function with one GPT call.
 
-        # Write the updated content back to the file
-        with open(file_path, 'w') as file:
-            file.writelines(lines)
+    Issues whose fix is missing from the batch response, or all of them when the
+    batch call fails or its response cannot be parsed, fall back to one
+    generate_fix call each.
 
-        logging.info(f"Replaced line {line_number} in {file_path} with suggested fix.")
+    Args:
+        token_manager (TokenManager): Provides the iGPT access token.
+        batch (list): Tuples of (issue, line_content, rerun_fix).
+        response_cache (ResponseCache): Optional cache of previously generated fixes.
 
-        # Check if this is a git workspace and print the new changes
-        if os.path.isdir(os.path.join(os.path.dirname(file_path), '.git')):
-            logging.info("Printing new changes in the file using git command:")
-            run_command(f"git diff {file_path}")
+    Returns:
+        list: The fix values, in the same order as batch.
+    """
+    fix_values = [None] * len(batch)
+    cache_keys = [None] * len(batch)
+    uncached = []
+    for index, (issue, line_content, rerun_fix) in enumerate(batch):
+        if response_cache:
+            cache_keys[index] = fix_cache_key(response_cache, issue, line_content, rerun_fix)
+            fix_values[index] = response_cache.get(cache_keys[index])
+        if fix_values[index] is None:
+            uncached.append(index)
+    if not uncached:
+        return fix_values
+    if len(uncached) == 1:
+        issue, line_content, rerun_fix = batch[uncached[0]]
+        fix_values[uncached[0]] = generate_fix(token_manager, issue, line_content, rerun_fix, response_cache, check_cache=False)
+        return fix_values
+
+    issues_text = "".join(
+        BATCH_ISSUE_TEMPLATE.format(id=index, issue=batch[index][0], code_with_issue=batch[index][1], rerun_fix=batch[index][2])
+        for index in uncached
+    )
+    prompt_input = f'"{BATCH_PROMPT_TEMPLATE.format(issues=issues_text)}"'
+    logging.info(f"Batch prompt input: {prompt_input}")
+    options = dict(GPT_OPTIONS, max_tokens=min(GPT_OPTIONS["max_tokens"] * len(uncached), GPT_MAX_OUTPUT_TOKENS))
+    with tracing.span("fix_batch", "llm", issues=len(uncached)):
+        try:
+            gpt_response = request_gpt_api(token_manager.get_token(), prompt_input, options)
+        except requests.exceptions.RequestException as e:
+            # The single issue requests still stop the run if the API is really down
+            logging.error(f"Batch GPT API call failed, falling back to single issue requests: {e}")
+            gpt_response = None
+        if gpt_response is not None:
+            logging.info("GPT API batch response:")
+            logging.info(json.dumps(gpt_response, indent=4))
+            try:
+                for entry in parse_gpt_json(gpt_response)["fixes"]:
+                    index = int(entry["id"])
+                    if index in uncached and fix_values[index] is None and isinstance(entry["fix"], str):
+                        fix_values[index] = entry["fix"]
+                        if cache_keys[index]:
+                            response_cache.put(cache_keys[index], entry["fix"])
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                logging.error(f"Failed to parse batch response, falling back to single issue requests: {e}")
+
+    for index in uncached:
+        if fix_values[index] is None:
+            issue, line_content, rerun_fix = batch[index]
+            fix_values[index] = generate_fix(token_manager, issue, line_content, rerun_fix, response_cache, check_cache=False)
+    return fix_values
+
+def filter_issues_to_pr(issues, pr_modified_files, radius, repo_root, pr_filter_stats):
+    """
+    Yields only the issues within radius lines of a line changed in the PR.
 
-    except Exception as e:
-        logging.error(f"Error replacing suggested fix in {file_path}: {e}")
+    Issues in files added by the PR are always kept. The number of dropped issues
+    is counted in pr_filter_stats["skipped"].
+    """
+    for issue in issues:
+        relative_file_name = os.path.relpath(issue.file_path, repo_root).replace("\\", "/")
+        lines = pr_modified_files.get(relative_file_name)
+        if lines is not None:
+            if not lines:  # Newly added files are entirely part of the diff
+                yield issue
+                continue
+            if any(line in lines for line in range(issue.line_number - radius, issue.line_number + radius + 1)):
+                yield issue
+                continue
+        logging.info(f"Skipping issue outside the PR diff: {issue.file_path}:{issue.line_number}")
+        pr_filter_stats["skipped"] += 1
+
+RERUN_FIX_TEMPLATE = "This suggested_fix {suggested_fix} does not solve the issue. Provide an alternate fix."
+
+def iter_pending_issues(issues, issue_store):
+    """
+    Yields (issue, line_content, rerun_fix) for each Issue record,
+    stopping at the first issue whose source line cannot be read.
+    """
+    for issue in issues:
+        logging.info(issue)
+        with tracing.span("prepare_issue", "bookkeeping"):
+            line_content = get_line_from_file(issue.file_path, issue.line_number)
+            rerun_fix = ""  # Initialize rerun_fix with a default value
+            for json_issue in issue_store.find(issue.file_path, issue.line_number) if line_content else []:
+                if json_issue["copilot_fixed"] == "false" and json_issue["suggested_fix"]:
+                    rerun_fix = RERUN_FIX_TEMPLATE.format(suggested_fix=json_issue['suggested_fix'])
+                    break
+        if not line_content:
+            logging.error(f"Error reading line {issue.line_number} from {issue.file_path}")
+            return
+        logging.info(f"Line {issue.line_number} from {issue.file_path}: {line_content}")
+        yield issue, line_content, rerun_fix
+
+def generate_fixes(token_manager, pending_issues, max_inflight, response_cache=None, batch_size=1):
+    """
+    Generates fixes for all pending issues with at most max_inflight GPT calls in flight.
+
+    pending_issues may be a generator: each issue is submitted as soon as it is
+    produced, so fix generation starts while the report is still being read.
+    With batch_size > 1, issues of the same file and function are grouped into
+    batches of up to batch_size issues that share one GPT call.
+
+    Args:
+        token_manager (TokenManager): Provides the iGPT access token.
+        pending_issues (iterable): Tuples of (issue, line_content, rerun_fix).
+        max_inflight (int): Maximum number of concurrent GPT calls.
+        response_cache (ResponseCache): Optional cache of previously generated fixes.
+        batch_size (int): Maximum number of issues per GPT call.
+
+    Returns:
+        list: (pending_issue, fix_value) tuples, in the same order as pending_issues. fix_value
+        is None for issues whose model reply could not be parsed.
+
+    Raises:
+        The first error of a GPT call, e.g. SystemExit once its retries are exhausted.
+        Issues not yet sent are cancelled instead of running their own retries.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_inflight)) as executor:
+        # Each slot is [pending_issue, future, index of the fix in the future's result]
+        slots = []
+        open_batches = {}
+        failed = threading.Event()
+
+        def on_done(future):
+            if not future.cancelled() and future.exception() is not None:
+                failed.set()
+
+        def submit(*call):
+            future = executor.submit(*call)
+            future.add_done_callback(on_done)
+            return future
+
+        def submit_batch(batch):
+            future = submit(generate_batch_fixes, token_manager, [slot[0] for slot in batch], response_cache)
+            for slot in batch:
+                slot[1] = future
+
+        try:
+            for pending_issue in pending_issues:
+                if failed.is_set():
+                    break
+                issue, line_content, rerun_fix = pending_issue
+                if batch_size <= 1:
+                    future = submit(generate_fix, token_manager, issue, line_content, rerun_fix, response_cache)
+                    slots.append([pending_issue, future, None])
+                    continue
+                batch_key = (issue.file_path, issue.function)
+                batch = open_batches.setdefault(batch_key, [])
+                slot = [pending_issue, None, len(batch)]
+                batch.append(slot)
+                slots.append(slot)
+                if len(batch) >= batch_size:
+                    submit_batch(open_batches.pop(batch_key))
+            if failed.is_set():
+                # Batches still open were never submitted, raise the error that stopped the submissions
+                for _, future, _ in slots:
+                    if future is not None and future.done() and not future.cancelled() and future.exception() is not None:
+                        future.result()
+            for batch in open_batches.values():
+                submit_batch(batch)
+
+            return [
+                (pending_issue, future.result() if index is None else future.result()[index])
+                for pending_issue, future, index in slots
+            ]
+        except BaseException:
+            # Only the calls already in flight are waited for
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+def generate_clustered_fixes(token_manager, pending_issues, threshold, max_inflight, response_cache=None, batch_size=1, cluster_stats=None):
+    """
+    Generates one fix per cluster of similar issues and adapts it to the other members.
+
+    Clusters come from cluster_issues. A member whose code line differs from the
+    leader's in more than identifiers or literals gets its own GPT call instead.
+
+    Args:
+        threshold (float): Minimum embedding cosine similarity between issues of a cluster.
+        cluster_stats (dict): Optional, accumulates issues, merge_key_groups, clusters, reused and fallbacks.
 
-def move_untracked_files():
+    Returns:
+        list: (pending_issue, fix_value) tuples, in the same order as pending_issues.
+    """
+    # Only needed with --dedupe_threshold, imported here to keep it off the startup path
+    from issue_clustering import cluster_issues, adapt_fix
+    pending_issues = list(pending_issues)
+    with tracing.span("cluster_issues", "llm", issues=len(pending_issues)):
+        clusters, merge_key_groups = cluster_issues(pending_issues, functools.partial(embed_texts, token_manager), threshold)
+    leader_fixes = generate_fixes(
+        token_manager, [pending_issues[cluster[0]] for cluster in clusters], max_inflight, response_cache, batch_size
+    )
+
+    fix_values = [None] * len(pending_issues)
+    fallbacks = []
+    for cluster, (leader, fix_value) in zip(clusters, leader_fixes):
+        fix_values[cluster[0]] = fix_value
+        for index in cluster[1:]:
+            adapted_fix = adapt_fix(leader[1], pending_issues[index][1], fix_value) if fix_value is not None else None
+            if adapted_fix is None:
+                fallbacks.append(index)
+            else:
+                logging.info(f"Reusing the fix of {leader[0].merge_key} for {pending_issues[index][0]!r}: {adapted_fix}")
+                fix_values[index] = adapted_fix
+    if fallbacks:
+        fallback_fixes = generate_fixes(
+            token_manager, [pending_issues[index] for index in fallbacks], max_inflight, response_cache, batch_size
+        )
+        for index, (_, fix_value) in zip(fallbacks, fallback_fixes):
+            fix_values[index] = fix_value
+
+    reused = len(pending_issues) - len(clusters) - len(fallbacks)
+    logging.info(
+        f"Clustered {len(pending_issues)} issues into {merge_key_groups} mergeKey groups and {len(clusters)} clusters, "
+        f"reused {reused} fixes, {len(fallbacks)} members needed their own fix."
+    )
+    if cluster_stats is not None:
+        for key, value in (("issues", len(pending_issues)), ("merge_key_groups", merge_key_groups),
+                           ("clusters", len(clusters)), ("reused", reused), ("fallbacks", len(fallbacks))):
+            cluster_stats[key] = cluster_stats.get(key, 0) + value
+    return list(zip(pending_issues, fix_values))
+
+def indent_fix(original_line, fix_value):
+    """
+    Returns the lines of fix_value indented like original_line.
+    """
+    leading_spaces = len(original_line) - len(original_line.lstrip())
+    return [' ' * leading_spaces + line + '\n' for line in fix_value.split('\n')]
+
+def apply_file_fixes(file_path, fixes):
+    """
+    Applies all fixes of one file with a single read and a single atomic write.
+
+    Line numbers refer to the file before any fix. Fixes are applied bottom-up so a
+    fix expanding one line into several does not shift the lines of the fixes above it.
+
+    Args:
+        file_path (str): File to rewrite.
+        fixes (dict): Line number to suggested fix.
+
+    Returns:
+        int: Number of fixes applied.
+    """
+    with open(file_path, 'r') as file:
+        lines = file.readlines()
+
+    applied = 0
+    for line_number in sorted(fixes, reverse=True):
+        if line_number < 1 or line_number > len(lines):
+            logging.error(f"Line {line_number} is outside {file_path}, skipping its suggested fix.")
+            continue
+        lines[line_number - 1:line_number] = indent_fix(lines[line_number - 1], fixes[line_number])
+        applied += 1
+
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.fix.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.writelines(lines)
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    source_cache.invalidate(file_path)
+    return applied
+
+def apply_suggested_fixes(issue_store):
+    """
+    Applies every accepted fix of the issue store, one pass per file, and logs one
+    consolidated diff of all the rewritten files.
+    """
+    fixes_by_file = {}
+    for json_issue in issue_store.issues:
+        if json_issue["copilot_fixed"] != "true":
+            continue
+        file_fixes = fixes_by_file.setdefault(json_issue["file_name"], {})
+        # Only one fix can replace a line, keep the first one recorded
+        file_fixes.setdefault(json_issue["line_number"], json_issue["suggested_fix"])
+
+    changed_files = []
+    for file_path, fixes in fixes_by_file.items():
+        try:
+            with tracing.span("apply_file_fixes", "bookkeeping", fixes=len(fixes)):
+                applied = apply_file_fixes(file_path, fixes)
+        except Exception as e:
+            logging.error(f"Error applying suggested fixes to {file_path}: {e}")
+            continue
+        logging.info(f"Applied {applied} suggested fixes to {file_path}.")
+        changed_files.append(file_path)
+
+    if changed_files:
+        logging.info("Printing the changes of the suggested fixes using git command:")
+        run_command(f"git --no-pager diff -- {' '.join(shlex.quote(file_path) for file_path in changed_files)}")
+    return changed_files
+
+def move_untracked_files(destination_dir='original-scan-result', copy=False):
+    """
+    Moves the untracked scan results to destination_dir, or copies them when copy is
+    set so a reused worktree keeps its idir for the next incremental capture.
+    """
     try:
         # Create the folder named original-scan-result
-        os.makedirs('original-scan-result', exist_ok=True)
+        os.makedirs(destination_dir, exist_ok=True)
 
         # Get the list of untracked files and folders
         result = subprocess.run("git ls-files --others --exclude-standard", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
@@ -197,17 +856,23 @@ def move_untracked_files():
         for file in untracked_files:
             if file == 'copilot_data.json':
                 continue
-            destination = os.path.join('original-scan-result', os.path.basename(file))
+            destination = os.path.join(destination_dir, os.path.basename(file))
             if os.path.isdir(file):
                 if os.path.exists(destination):
                     shutil.rmtree(destination)
-                shutil.move(file, destination)
+                if copy:
+                    shutil.copytree(file, destination, symlinks=True)
+                else:
+                    shutil.move(file, destination)
             else:
                 if os.path.exists(destination):
                     os.remove(destination)
-                shutil.move(file, destination)
+                if copy:
+                    shutil.copy2(file, destination)
+                else:
+                    shutil.move(file, destination)
 
-        logging.info("Moved untracked files and folders to original-scan-result folder.")
+        logging.info(f"{'Copied' if copy else 'Moved'} untracked files and folders to {destination_dir} folder.")
     except Exception as e:
         logging.error(f"Error moving untracked files: {e}")
 
@@ -239,9 +904,13 @@ def commit_and_push_changes(jira_id, branch_name, modified_files):
         logging.error(f"Error committing and pushing changes: {e}")
         sys.exit(1)
 
+def count_github_request(endpoint, response):
+    tracing.count("github_requests", endpoint=endpoint, status=response.status_code)
+    tracing.count("github_response_bytes", len(response.content), endpoint=endpoint)
+
 def get_github_prs(repo, branch, token):
     try:
-        url = f"https://api.github.com/repos/{repo}/pulls"
+        url = f"{GITHUB_API_URL}/repos/{repo}/pulls"
         headers = {
             'Authorization': f'token {token}',
             'Accept': 'application/vnd.github.v3+json'
@@ -250,7 +919,9 @@ def get_github_prs(repo, branch, token):
             'head': branch,
             'state': 'open'
         }
-        response = requests.get(url, headers=headers, params=params)
+        with tracing.span("get_github_prs", "github"):
+            response = get_session(url).get(url, headers=headers, params=params)
+        count_github_request("pulls", response)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -272,7 +943,7 @@ def create_github_review(repo, pr_number, token, comments, body):
         None
     """
     try:
-        url = f"https://api.github.com/repos/{repo}/pulls/{pr_number}/reviews"
+        url = f"{GITHUB_API_URL}/repos/{repo}/pulls/{pr_number}/reviews"
         headers = {
             'Authorization': f'token {token}',
             'Accept': 'application/vnd.github.v3+json'
@@ -282,7 +953,9 @@ def create_github_review(repo, pr_number, token, comments, body):
             'event': 'COMMENT',
             'comments': comments
         }
-        response = requests.post(url, headers=headers, json=data)
+        with tracing.span("create_github_review", "github", comments=len(comments)):
+            response = get_session(url).post(url, headers=headers, json=data)
+        count_github_request("reviews", response)
         response.raise_for_status()
         logging.info(f"Created review for PR #{pr_number}")
     except requests.exceptions.RequestException as e:
@@ -290,7 +963,7 @@ def create_github_review(repo, pr_number, token, comments, body):
 
 def create_pull_request(repo, token, title, head, base, body):
     try:
-        url = f"https://api.github.com/repos/{repo}/pulls"
+        url = f"{GITHUB_API_URL}/repos/{repo}/pulls"
         headers = {
             'Authorization': f'token {token}',
             'Accept': 'application/vnd.github+json'
@@ -302,7 +975,9 @@ def create_pull_request(repo, token, title, head, base, body):
             'body': body
         }
         logging.info(f"Creating pull request from {head} to {base} with data: {data}")
-        response = requests.post(url, headers=headers, json=data)
+        with tracing.span("create_pull_request", "github"):
+            response = get_session(url).post(url, headers=headers, json=data)
+        count_github_request("pulls", response)
         response.raise_for_status()
         pr = response.json()
         logging.info(f"Created pull request #{pr['number']}")
@@ -311,16 +986,264 @@ def create_pull_request(repo, token, title, head, base, body):
         logging.error(f"Failed to create pull request: {e}")
         return None
 
-def load_coverity_commands(language):
+def load_coverity_commands(coverity_commands_path=None):
+    # Imported on first use so importing this module does not load the YAML parser
+    import yaml
     try:
-        coverity_commands_path = os.path.join(script_dir, 'coverity_commands.yaml')
+        if not coverity_commands_path:
+            coverity_commands_path = os.path.join(script_dir, 'coverity_commands.yaml')
         with open(coverity_commands_path, 'r') as file:
-            commands = yaml.safe_load(file)
-            return commands.get(language, [])
+            return yaml.safe_load(file)
     except Exception as e:
         logging.error(f"Error loading Coverity commands: {e}")
         sys.exit(1)
 
+PR_FILE_LIST = 'pr_files.lst'
+C_SOURCE_EXTENSIONS = ('.c', '.cc', '.cpp', '.cxx')
+C_HEADER_EXTENSIONS = ('.h', '.hh', '.hpp', '.hxx')
+
+def get_pr_make_targets(pr_files):
+    """
+    Returns the make object targets to capture for the files changed in a PR.
+
+    Changed C/C++ sources are captured directly, and a changed header pulls in
+    every tracked source that includes it.
+    """
+    sources = set()
+    for pr_file in pr_files:
+        if not os.path.exists(pr_file):
+            continue
+        if pr_file.endswith(C_SOURCE_EXTENSIONS):
+            sources.add(pr_file)
+        elif pr_file.endswith(C_HEADER_EXTENSIONS):
+            header = re.escape(os.path.basename(pr_file))
+            result = subprocess.run(
+                ["git", "grep", "-l", "-E", f'#[[:space:]]*include[[:space:]]*[<"](.*/)?{header}[>"]', "--"]
+                + [f"*{extension}" for extension in C_SOURCE_EXTENSIONS],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+            )
+            dependents = result.stdout.splitlines()
+            logging.info(f"Sources including {pr_file}: {dependents}")
+            sources.update(dependents)
+    return sorted(os.path.splitext(source)[0] + '.o' for source in sources)
+
+def load_pr_command_graph(pipelines, language, variables, changed_files):
+    """
+    Returns the '<language>_pr' stage graph rendered for the changed files (the files
+    of a PR or the files rewritten by fixes), or None when the full repository
+    pipeline has to be used instead.
+    """
+    pipeline_name = f"{language}_pr"
+    if pipeline_name not in pipelines:
+        logging.info(f"No changed-files capture commands for {language}, capturing the whole repository.")
+        return None
+    if not changed_files:
+        logging.info("No changed files, capturing the whole repository.")
+        return None
+    if uses_variable(pipelines, pipeline_name, "pr_targets"):
+        pr_targets = get_pr_make_targets(changed_files)
+        if not pr_targets:
+            logging.info("No C/C++ translation units changed, capturing the whole repository.")
+            return None
+        variables["pr_targets"] = ' '.join(pr_targets)
+    logging.info(f"Capturing only the {len(changed_files)} changed files for {language}.")
+    return load_command_graph(pipelines, pipeline_name, variables, prefix=language)
+
+def get_pipeline_variables(language, languages, jobs):
+    """
+    Returns the command placeholders of one language. A single language keeps the
+    historical idir and local_report.json paths, several languages get their own.
+    """
+    suffix = f"_{language}" if len(languages) > 1 else ""
+    return {
+        "config": f"coverity_config{suffix}/coverity.xml",
+        "idir": f"idir{suffix}",
+        "jobs": jobs,
+        "report": f"local_report{suffix}.json",
+        "text_report": f"local_report{suffix}.txt",
+        "pr_file_list": PR_FILE_LIST,
+        "pr_targets": ""
+    }
+
+def build_coverity_graph(pipelines, languages, jobs, changed_files=None):
+    """
+    Combines the pipelines of all languages into one stage graph.
+
+    Args:
+        pipelines (dict): The parsed coverity_commands.yaml.
+        languages (list): Languages to analyze, each in its own idir.
+        jobs (int): Analysis worker count per language.
+        changed_files (dict): Changed files and lines, enables the changed-files (_pr) pipelines.
+
+    Returns:
+        tuple: (graph, JSON report paths, whether any language captures only the changed files)
+    """
+    graph = {}
+    reports = []
+    pr_capture = False
+    for language in languages:
+        variables = get_pipeline_variables(language, languages, jobs)
+        language_graph = None
+        try:
+            if changed_files is not None:
+                language_graph = load_pr_command_graph(pipelines, language, variables, changed_files)
+                pr_capture = pr_capture or language_graph is not None
+            if language_graph is None:
+                language_graph = load_command_graph(pipelines, language, variables, prefix=language)
+        except (KeyError, ValueError) as e:
+            logging.error(f"Invalid Coverity commands for {language}: {e}")
+            sys.exit(1)
+        if language_graph is None:
+            logging.error(f"No Coverity commands found for language {language}")
+            sys.exit(1)
+        graph.update(language_graph)
+        reports.append(variables["report"])
+    return graph, reports, pr_capture
+
+def write_pr_file_list(changed_files):
+    with open(PR_FILE_LIST, 'w') as file:
+        for pr_file in changed_files:
+            if os.path.exists(pr_file):
+                file.write(f"{pr_file}\n")
+
+def verify_fixes(issue_store, pipelines, languages, jobs):
+    """
+    Re-captures and re-analyzes only the files rewritten by the applied fixes and
+    compares the findings with the fixed issues by mergeKey.
+
+    Fixed issues whose mergeKey is still reported are marked copilot_fixed "false".
+    Every verified issue gets a "verification" status of "fixed" or "still_present".
+
+    Returns:
+        tuple: (counts of fixed, still_present and new issues,
+                list of (JSON issue, reported Issue record) for every fix still failing)
+    """
+    repo_root = os.getcwd()
+    fixed_files = {os.path.relpath(file_name, repo_root): [] for file_name in issue_store.fixed_files()}
+    if not fixed_files:
+        logging.info("No applied fixes to verify.")
+        return {"fixed": 0, "still_present": 0, "new": 0}, []
+    logging.info(f"Verifying fixes in {len(fixed_files)} files...")
+    graph, reports, incremental = build_coverity_graph(pipelines, languages, jobs, fixed_files)
+    if incremental:
+        write_pr_file_list(fixed_files)
+    run_command_graph(graph, run_command, cancel=cancel_running_commands)
+
+    reported_issues = {}
+    new_issue_count = 0
+    known_keys = {json_issue.get("merge_key") for json_issue in issue_store.issues}
+    for issue in itertools.chain.from_iterable(read_issues(json_report) for json_report in reports):
+        reported_issues.setdefault(issue.merge_key, issue)
+        if issue.merge_key not in known_keys and os.path.relpath(issue.file_path, repo_root) in fixed_files:
+            logging.info(f"New issue introduced by a fix: {issue}")
+            new_issue_count += 1
+
+    verify_stats = {"fixed": 0, "still_present": 0, "new": new_issue_count}
+    still_present = []
+    for json_issue in issue_store.issues:
+        if json_issue.get("copilot_fixed") != "true":
+            continue
+        if json_issue.get("merge_key") in reported_issues:
+            json_issue["copilot_fixed"] = "false"
+            json_issue["verification"] = "still_present"
+            verify_stats["still_present"] += 1
+            still_present.append((json_issue, reported_issues[json_issue["merge_key"]]))
+        else:
+            json_issue["verification"] = "fixed"
+            verify_stats["fixed"] += 1
+        issue_store.mark_dirty()
+    issue_store.flush()
+    logging.info(f"Fix verification: {verify_stats}")
+    return verify_stats, still_present
+
+def regenerate_failed_fixes(token_manager, still_present, issue_store, max_inflight, response_cache=None, batch_size=1):
+    """
+    Asks for an alternate fix of every fix still failing after verify_fixes, like a
+    full rerun does. The new fix replaces the original line again, so the prompt
+    gets the original code with the rejected fix as hint, and accepted fixes are
+    marked copilot_fixed "true" to be applied and verified by the next rerun.
+
+    Returns:
+        int: Number of alternate fixes recorded.
+    """
+    pending_issues = []
+    for json_issue, reported_issue in still_present:
+        # Events come from the new report, the location is the one the fix replaces
+        issue = Issue(
+            reported_issue.merge_key, json_issue["file_name"], json_issue["line_number"], json_issue.get("column_number"),
+            reported_issue.checker, reported_issue.language, reported_issue.function, reported_issue.events
+        )
+        rerun_fix = RERUN_FIX_TEMPLATE.format(suggested_fix=json_issue["suggested_fix"])
+        pending_issues.append((issue, json_issue["code_with_issue"], rerun_fix))
+
+    regenerated = 0
+    fix_results = generate_fixes(token_manager, pending_issues, max_inflight, response_cache, batch_size)
+    for (json_issue, _), (_, fix_value) in zip(still_present, fix_results):
+        if fix_value is None:
+            continue
+        json_issue["suggested_fix"] = fix_value
+        json_issue["copilot_fixed"] = "true"
+        json_issue.pop("verification", None)
+        regenerated += 1
+    if regenerated:
+        issue_store.mark_dirty()
+        issue_store.flush()
+    logging.info(f"Recorded {regenerated} alternate fixes for {len(still_present)} fixes still failing.")
+    return regenerated
+
+IDIR_CACHE_HISTORY = 100
+
+def get_coverity_version():
+    """
+    Returns the Coverity toolchain identification, or None if it cannot be determined.
+    """
+    try:
+        result = subprocess.run("cov-analyze --ident", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        if result.returncode != 0:
+            logging.error(f"Error getting the Coverity version: {result.stderr}")
+            return None
+        return result.stdout.strip()
+    except Exception as e:
+        logging.error(f"Exception occurred while getting the Coverity version: {e}")
+        return None
+
+def get_commit_history(max_count=IDIR_CACHE_HISTORY):
+    """
+    Returns HEAD and its ancestors, closest first.
+    """
+    result = subprocess.run(f"git rev-list --max-count={max_count} HEAD", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        logging.error(f"Error reading the commit history: {result.stderr}")
+        return []
+    return result.stdout.split()
+
+def get_idir_cache_paths(language, languages, jobs):
+    variables = get_pipeline_variables(language, languages, jobs)
+    return [variables["idir"], os.path.dirname(variables["config"])]
+
+def seed_idir_cache(idir_cache, coverity_version, languages, jobs):
+    """
+    Restores the idir and configuration of every language from the cache entry of
+    the closest ancestor commit, so Coverity only has to capture the delta.
+    """
+    commits = get_commit_history()
+    for language in languages:
+        toolchain_key = IdirCache.toolchain_key(coverity_version, language, os.getcwd())
+        commit, entry_path = idir_cache.lookup(toolchain_key, commits)
+        if entry_path is None:
+            logging.info(f"No cached Coverity idir for {language}, capturing from scratch.")
+            continue
+        logging.info(f"Seeding the {language} Coverity idir from commit {commit}.")
+        idir_cache.seed(entry_path, get_idir_cache_paths(language, languages, jobs))
+
+def store_idir_cache(idir_cache, coverity_version, languages, jobs):
+    commits = get_commit_history(max_count=1)
+    if not commits:
+        return
+    for language in languages:
+        toolchain_key = IdirCache.toolchain_key(coverity_version, language, os.getcwd())
+        idir_cache.store(toolchain_key, commits[0], get_idir_cache_paths(language, languages, jobs))
+
 def get_base_branch():
     try:
         result = subprocess.run("git symbolic-ref --short HEAD", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
@@ -332,10 +1255,91 @@ def get_base_branch():
         logging.error(f"Exception occurred while getting base branch: {e}")
         sys.exit(1)
 
-def setup_update_workspace(branch, json_file_path, rerun):
+# Scan worktree and the files rewritten by fixes in it, set in main() when --workspace is worktree
+workspace_settings = {"worktree": None, "fixed_files": set()}
+
+WORKTREE_SLOTS = 16
+
+def create_worktree(base_branch, worktree_dir=None):
+    """
+    Creates a detached worktree of base_branch in which every scan run, fix and
+    commit happens, leaving the user's checkout untouched. The worktree is removed
+    when the script exits.
+
+    Without worktree_dir, the first free of a few fixed paths inside the git directory
+    is used. Concurrent runs get different paths, and consecutive runs get the same
+    one, so the idir cache, which is keyed by work tree path, is reused.
+
+    Returns:
+        str: Absolute path of the worktree.
+    """
+    repo_dir = os.getcwd()
+    if worktree_dir:
+        candidates = [os.path.abspath(worktree_dir)]
+    else:
+        result = subprocess.run("git rev-parse --git-common-dir", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        if result.returncode != 0:
+            logging.error(f"Error locating the git directory: {result.stderr}")
+            sys.exit(1)
+        worktrees_dir = os.path.join(os.path.abspath(result.stdout.strip()), 'coverity-worktrees')
+        candidates = [os.path.join(worktrees_dir, f"scan-{slot}") for slot in range(WORKTREE_SLOTS)]
+        # Forget worktrees of killed runs whose directory is gone, so their path can be reused
+        subprocess.run("git worktree prune", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    for candidate in candidates:
+        # git refuses a path that is in use, which also settles races between concurrent runs
+        result = subprocess.run(
+            f"git worktree add --detach {shlex.quote(candidate)} {base_branch}", shell=True,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        )
+        if result.returncode == 0:
+            worktree_dir = candidate
+            break
+        logging.info(f"Cannot create worktree {candidate}: {result.stderr.strip()}")
+    else:
+        logging.error("Error creating the scan worktree, no usable path left.")
+        sys.exit(1)
+    atexit.register(remove_worktree, worktree_dir, repo_dir)
+    logging.info(f"Scanning in worktree {worktree_dir}")
+    return worktree_dir
+
+def remove_worktree(worktree_dir, repo_dir):
+    # Runs at exit, so failures are only logged
+    result = subprocess.run(
+        f"git worktree remove --force {shlex.quote(worktree_dir)}", shell=True, cwd=repo_dir,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+    )
+    if result.returncode != 0:
+        logging.error(f"Error removing worktree {worktree_dir}: {result.stderr}")
+    else:
+        logging.info(f"Removed worktree {worktree_dir}")
+
+def reset_worktree(issue_store):
+    """
+    Restores only the files rewritten by the previous fixes and applies the current ones.
+
+    Build outputs and the idir are kept, so make and cov-build only recapture what
+    the fixes changed.
+    """
+    fixed_files = workspace_settings["fixed_files"]
+    if fixed_files:
+        run_command(f"git checkout -- {' '.join(shlex.quote(file_path) for file_path in sorted(fixed_files))}")
+        for file_path in fixed_files:
+            source_cache.invalidate(file_path)
+    workspace_settings["fixed_files"] = set(apply_suggested_fixes(issue_store))
+
+def setup_update_workspace(branch, issue_store, rerun):
+    # Make sure the JSON file on disk is current before the workspace is cleaned and stashed
+    issue_store.flush()
+
+    if workspace_settings["worktree"]:
+        # The worktree stays on its own commit or branch, only the fixes change between runs
+        reset_worktree(issue_store)
+        return
+
     # Clean up the workspace, skip cleaning the original-scan-result folder and JSON file if it exists
     logging.info("Cleaning up the workspace...")
-    run_command(f"git clean -xdf -e original-scan-result -e {json_file_path}")
+    log_dir_exclude = f" -e {command_settings['log_dir']}" if command_settings["log_dir"] else ""
+    run_command(f"git clean -xdf -e original-scan-result -e {issue_store.json_file_path}{log_dir_exclude}")
     
     # Stash untracked files
     run_command("git stash push -m 'Stash untracked files' --include-untracked")
@@ -346,17 +1350,12 @@ def setup_update_workspace(branch, json_file_path, rerun):
     
     # Apply the stash to restore untracked files
     run_command("git stash pop")
+
+    # The checkout rewrote the work tree, drop every cached source file
+    source_cache.clear()
     
-    # Apply suggested fixes from JSON file
-    # json_file_path = os.path.join('original-scan-result', 'copilot_data.json') if rerun > 0 else 'copilot_data.json'
-    with open(json_file_path, 'r+') as json_file:
-        json_data = json.load(json_file)
-        for json_issue in json_data["issues"]:
-            if json_issue["copilot_fixed"] == "true":
-                file_path = json_issue["file_name"]
-                line_number = json_issue["line_number"]
-                suggested_fix = json_issue["suggested_fix"]
-                replace_suggested_fix(file_path, line_number, suggested_fix)
+    # Apply suggested fixes from the issue store
+    apply_suggested_fixes(issue_store)
 
 def generate_summary_table(json_data):
     issues = json_data.get("issues", [])
@@ -365,61 +1364,103 @@ def generate_summary_table(json_data):
         summary_data.append({
             "Line No": issue["line_number"],
             "File": issue["file_name"],
-            "Issue code": issue["issue"],
+            "Issue code": issue.get("checker_name") or issue["issue"],
             "Fix suggested by copilot": "Yes" if issue["copilot_fixed"] == "true" else "No"
         })
-    df = pd.DataFrame(summary_data)
-    return df.to_markdown(index=False)
+    return markdown_table(summary_data)
 
 # Add this function to check if there is any suggested fix to apply
-def has_suggested_fixes(json_file_path):
-    try:
-        with open(json_file_path, 'r') as json_file:
-            json_data = json.load(json_file)
-            for issue in json_data.get("issues", []):
-                if issue.get("copilot_fixed") == "true":
-                    return True
-        return False
-    except Exception as e:
-        logging.error(f"Error checking for suggested fixes in {json_file_path}: {e}")
-        sys.exit(1)
+def has_suggested_fixes(issue_store):
+    return issue_store.has_suggested_fixes()
+
+HUNK_HEADER_PATTERN = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@')
+GITHUB_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'coverity-assistant', 'github')
+GITHUB_PAGE_SIZE = 100
 
-def get_pr_modified_files(repo, pr_number, token):
+def parse_patch_positions(patch):
+    """
+    Maps each new-file line of a unified diff patch to its GitHub review comment position.
+
+    Position 1 is the line below the first hunk header, and every following line,
+    including later hunk headers and removed lines, takes the next position.
+    Only context and added lines have a new-file line number.
+    """
+    positions = {}
+    position = 0
+    new_line = None
+    for line in patch.split('\n'):
+        if line.startswith('@@'):
+            match = HUNK_HEADER_PATTERN.match(line)
+            if not match:
+                raise ValueError(f"Invalid hunk header: {line}")
+            if position:
+                position += 1
+            new_line = int(match.group(1))
+            continue
+        if new_line is None:
+            continue
+        position += 1
+        if line.startswith('-') or line.startswith('\\'):
+            continue
+        positions[new_line] = position
+        new_line += 1
+    return positions
+
+def fetch_github_pages(url, headers, params, cache=None):
+    """
+    Yields the JSON body of every page of a paginated GitHub API listing.
+
+    Each page is requested with the ETag of its cached copy, so unchanged pages
+    come back as 304 Not Modified and are served from cache.
+    """
+    session = get_session(url)
+    while url:
+        cache_key = hashlib.sha256(json.dumps([url, params], sort_keys=True).encode('utf-8')).hexdigest()
+        cached = cache.get(cache_key) if cache else None
+        request_headers = dict(headers)
+        if cached:
+            request_headers['If-None-Match'] = cached["etag"]
+        with tracing.span("fetch_github_page", "github"):
+            response = session.get(url, headers=request_headers, params=params)
+        count_github_request("files", response)
+        if response.status_code == 304 and cached:
+            logging.info(f"GitHub page not modified, using the cached copy: {response.url}")
+            body, url = cached["body"], cached["next"]
+        else:
+            response.raise_for_status()
+            body = response.json()
+            url = response.links.get('next', {}).get('url')
+            if cache and response.headers.get('ETag'):
+                cache.put(cache_key, {"etag": response.headers['ETag'], "body": body, "next": url})
+        # The next link already carries the query parameters
+        params = None
+        yield body
+
+def get_pr_modified_files(repo, pr_number, token, cache=None):
+    """
+    Returns the files added or modified by the PR, each mapped to a dict from new-file
+    line number to review comment position. The dict is empty when GitHub sends no
+    patch, e.g. for large files, in which case the whole file is considered changed.
+    """
     try:
         logging.info(f"Fetching modified files for PR #{pr_number} in repository {repo}...")
-        url = f"https://api.github.com/repos/{repo}/pulls/{pr_number}/files"
+        url = f"{GITHUB_API_URL}/repos/{repo}/pulls/{pr_number}/files"
         headers = {
             'Authorization': f'token {token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        files = response.json()
-        logging.debug(f"Response from GitHub API: {json.dumps(files, indent=4)}")
-
         modified_files = {}
-        for file in files:
-            file_path = file["filename"]
-            logging.info(f"Processing file: {file_path}, status: {file['status']}")
-            if file["status"] == "added":
-                # For added files, include the entire file
-                modified_files[file_path] = []
-            elif file["status"] == "modified":
-                modified_lines = []
-                if "patch" in file:
-                    # Extract modified line numbers from the patch
-                    for line in file["patch"].split("\n"):
-                        if line.startswith("@@"):
-                            # Extract line numbers from the hunk header
-                            hunk_info = line.split(" ")[1]
-                            start_line = int(hunk_info.split(",")[0].replace("+", ""))
-                            line_count = int(hunk_info.split(",")[1]) if "," in hunk_info else 1
-                            modified_lines.extend(range(start_line, start_line + line_count))
-                            logging.debug(f"Extracted modified lines: {modified_lines}")
-                modified_files[file_path] = modified_lines
-        logging.info(f"Modified files and lines: {modified_files}")
+        for files in fetch_github_pages(url, headers, {'per_page': GITHUB_PAGE_SIZE}, cache):
+            logging.debug(f"Response from GitHub API: {json.dumps(files, indent=4)}")
+            for file in files:
+                file_path = file["filename"]
+                logging.info(f"Processing file: {file_path}, status: {file['status']}")
+                if file["status"] in ("added", "modified"):
+                    modified_files[file_path] = parse_patch_positions(file["patch"]) if "patch" in file else {}
+        logging.info(f"Modified files: {len(modified_files)}")
+        logging.debug(f"Modified files and lines: {modified_files}")
         return modified_files
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         logging.error(f"Failed to fetch PR modified files: {e}")
         return {}
 
@@ -431,43 +1472,97 @@ def get_relative_path(file_path, repo_root):
         return file_path[len(repo_root):].lstrip("/")
     return file_path
 
-def generate_report_table(json_file_path, start_time, repo_name):
+def generate_report_table(issue_store, start_time, repo_name, cache_stats=None, pr_skipped_issues=None, verify_stats=None, cluster_stats=None, request_stats=None):
     try:
-        with open(json_file_path, 'r') as json_file:
-            json_data = json.load(json_file)
-            issues = json_data.get("issues", [])
-            total_issues = len(issues)
-            resolved_issues = sum(1 for issue in issues if issue.get("copilot_fixed") == "true")
-            unresolved_issues = total_issues - resolved_issues
-            resolution_percentage = (resolved_issues / total_issues * 100) if total_issues > 0 else 0
-            execution_time = time.time() - start_time
-
-            # Prepare the report table
-            report_data = [
-                ["Repository", repo_name],
-                ["Total Issues Found", total_issues],
-                ["Issues Resolved by AI", resolved_issues],
-                ["% of Issues Resolved", f"{resolution_percentage:.2f}%"],
-                ["Time Taken (seconds)", f"{execution_time:.2f}"]
-            ]
-
-            # Format the table
-            report_table = "\n".join([f"{row[0]:<30}: {row[1]}" for row in report_data])
-            return report_table
+        issues = issue_store.issues
+        total_issues = len(issues)
+        resolved_issues = sum(1 for issue in issues if issue.get("copilot_fixed") == "true")
+        unresolved_issues = total_issues - resolved_issues
+        resolution_percentage = (resolved_issues / total_issues * 100) if total_issues > 0 else 0
+        execution_time = time.time() - start_time
+
+        # Prepare the report table
+        report_data = [
+            ["Repository", repo_name],
+            ["Total Issues Found", total_issues],
+            ["Issues Resolved by AI", resolved_issues],
+            ["% of Issues Resolved", f"{resolution_percentage:.2f}%"],
+            ["Time Taken (seconds)", f"{execution_time:.2f}"]
+        ]
+        if cache_stats:
+            report_data.append(["LLM Cache Hits", cache_stats["hits"]])
+            report_data.append(["LLM Cache Misses", cache_stats["misses"]])
+        if pr_skipped_issues is not None:
+            report_data.append(["Issues Skipped (outside PR)", pr_skipped_issues])
+        if verify_stats:
+            report_data.append(["Fixes Verified", verify_stats["fixed"]])
+            report_data.append(["Fixes Still Failing", verify_stats["still_present"]])
+            report_data.append(["New Issues From Fixes", verify_stats["new"]])
+        if cluster_stats:
+            report_data.append(["Issue Clusters", f"{cluster_stats['clusters']} ({cluster_stats['merge_key_groups']} mergeKey groups)"])
+            report_data.append(["Fixes Reused From Clusters", cluster_stats["reused"]])
+        if request_stats:
+            report_data.append(["LLM Requests", request_stats["requests"]])
+            report_data.append(["LLM Request Retries", request_stats["retries"]])
+            report_data.append(["LLM Throttle Waits", f"{request_stats['throttle_waits']} ({request_stats['throttle_wait_seconds']:.1f}s)"])
+            report_data.append(["LLM Request Failures", request_stats["failures"]])
+
+        # Format the table
+        report_table = "\n".join([f"{row[0]:<30}: {row[1]}" for row in report_data])
+        return report_table
     except Exception as e:
         logging.error(f"Error generating report table: {e}")
         return None
 
+# Arguments of main() holding file or directory paths
+WORKTREE_PATH_ARGUMENTS = (
+    'coverity_commands', 'worktree_dir', 'stage_log_dir', 'timings_file', 'trace_file', 'metrics_file',
+    'llm_cache_dir', 'idir_cache_dir'
+)
+
 def main():
     parser = argparse.ArgumentParser(description='Coverity Analysis Script')
     parser.add_argument('--skip_analysis', action='store_true', help='Skip git cleaning and Coverity commands')
     parser.add_argument('--rerun_count', type=int, default=1, help='Number of times to rerun the script if issues are found')
+    parser.add_argument('--verify_mode', choices=['full', 'incremental'], default='full', help='full reruns the whole scan on every rerun, incremental re-analyzes only the files rewritten by fixes')
     parser.add_argument('--scan_scope', choices=['pr', 'repo'], required=True, help='Scope of the scan: pr or repo')
     parser.add_argument('--jira_id', required=True, help='JIRA ID for the commit message prefix')
     parser.add_argument('--github_repo', required=True, help='GitHub repository in the format owner/repo')
     parser.add_argument('--pr_number', type=int, help='Pull Request number (required if scan_scope is pr)')
-    parser.add_argument('--language', required=True, help='Programming language for Coverity analysis')
+    parser.add_argument('--language', required=True, nargs='+', help='Programming languages for Coverity analysis, e.g. c python')
+    parser.add_argument('--coverity_commands', help='Pipelines file to use instead of coverity_commands.yaml next to this script')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Coverity analysis workers, shared between languages (default: number of cores)')
+    parser.add_argument('--pr_line_radius', type=int, default=0, help='In PR scope, also fix issues up to this many lines away from a changed line')
+    parser.add_argument('--workspace', choices=['checkout', 'worktree'], default='checkout', help='checkout cleans and re-checks out the current checkout on every run, worktree scans in a dedicated git worktree reused across reruns')
+    parser.add_argument('--worktree_dir', help='Location of the scan worktree (default: inside the git directory)')
+    parser.add_argument('--stage_log_dir', default='coverity_logs', help='Directory receiving one output log per Coverity stage')
+    parser.add_argument('--stage_timeout', type=int, help='Default timeout in seconds for each Coverity stage')
+    parser.add_argument('--timings_file', default='coverity_timings.json', help='File receiving wall/CPU time and peak RSS of every command')
+    parser.add_argument('--trace_file', default='coverity_trace.json', help='File receiving the timing spans and counters of the run in Chrome trace format (empty to disable)')
+    parser.add_argument('--metrics_file', default='coverity_metrics.prom', help='Prometheus textfile receiving the stage times and counters of the run (empty to disable)')
+    parser.add_argument('--max_inflight', type=int, default=8, help='Maximum number of concurrent fix generation requests')
+    parser.add_argument('--batch_size', type=int, default=1, help='Maximum number of issues of the same file and function fixed by one LLM request (1 disables batching)')
+    parser.add_argument('--stream_fixes', action='store_true', help='Use the streaming GPT endpoint for single issue fixes and stop reading once the fix is complete')
+    parser.add_argument('--dedupe_threshold', type=float, help='Generate one fix per cluster of issues with the same mergeKey or an embedding cosine similarity of at least this value, e.g. 0.95 (default: disabled)')
+    parser.add_argument('--http_pool_size', type=int, help='Maximum keep-alive connections per host (default: max_inflight)')
+    parser.add_argument('--llm_rate_limit', type=float, help='Maximum LLM requests per second across all threads (default: unlimited)')
+    parser.add_argument('--llm_burst', type=int, help='LLM requests that may be sent at once before --llm_rate_limit applies')
+    parser.add_argument('--llm_max_retries', type=int, default=5, help='Retries of an LLM request failing with a connection error, timeout, 429 or 5xx')
+    parser.add_argument('--llm_connect_timeout', type=float, default=10, help='Seconds to connect to the LLM gateway')
+    parser.add_argument('--llm_read_timeout', type=float, default=300, help='Seconds to wait for data from the LLM gateway')
+    parser.add_argument('--llm_cache_dir', help='Directory of the LLM response cache (default: ~/.cache/coverity-assistant/llm)')
+    parser.add_argument('--llm_cache_max_age', type=float, default=7, help='Maximum age in days of LLM response cache entries')
+    parser.add_argument('--llm_cache_max_size', type=int, default=256, help='Maximum size in MB of the LLM response cache')
+    parser.add_argument('--idir_cache_dir', help='Directory of the Coverity idir cache (default: ~/.cache/coverity-assistant/idir)')
+    parser.add_argument('--idir_cache_entries', type=int, default=4, help='Number of cached commits kept per Coverity version and language')
+    parser.add_argument('--disable_idir_cache', action='store_true', help='Always capture from an empty Coverity idir')
+    parser.add_argument('--disable_llm_cache', action='store_true', help='Always call the LLM, bypassing the response cache')
     args = parser.parse_args()
+    if args.workspace == 'worktree' and not args.skip_analysis:
+        # The run moves into the worktree, resolve every path argument against the user's checkout first
+        for path_argument in WORKTREE_PATH_ARGUMENTS:
+            if getattr(args, path_argument):
+                setattr(args, path_argument, os.path.abspath(getattr(args, path_argument)))
 
     # Initialize variables
     start_time = time.time()
@@ -478,117 +1573,170 @@ def main():
     pr_number = args.pr_number  # Set pr_number from args
     logging.info(f"PR number: {pr_number}")
 
+    command_settings["log_dir"] = args.stage_log_dir
+    command_settings["timeout"] = args.stage_timeout
+    gpt_settings["stream"] = args.stream_fixes
+    # Registered before the worktree cleanup, atexit runs them last so they cover the whole run
+    atexit.register(
+        write_trace_files,
+        os.path.abspath(args.trace_file) if args.trace_file else None,
+        os.path.abspath(args.metrics_file) if args.metrics_file else None
+    )
+    if args.timings_file:
+        atexit.register(write_command_timings, os.path.abspath(args.timings_file))
+
     set_environment_variables()
+    configure_pools(pool_maxsize=args.http_pool_size or args.max_inflight)
+    configure_scheduler(
+        rate=args.llm_rate_limit, burst=args.llm_burst, max_retries=args.llm_max_retries,
+        connect_timeout=args.llm_connect_timeout, read_timeout=args.llm_read_timeout
+    )
     # Get access token
     github_token = os.getenv('GH_TOKEN')
     if not github_token:
         logging.error("GH_TOKEN environment variable must be set.")
         sys.exit(1)
 
-    access_token = get_access_token()
+    token_manager = get_access_token()
+    response_cache = None
+    if not args.disable_llm_cache:
+        response_cache = ResponseCache(
+            cache_dir=args.llm_cache_dir,
+            max_age=args.llm_cache_max_age * 24 * 3600,
+            max_bytes=args.llm_cache_max_size * 1024 * 1024
+        )
     rerun = 0
     modified_files = set()
     new_branch_name = f"copilot-scan-{datetime.now().strftime('%Y%m%d%H%M%S')}"
 
-    coverity_commands = load_coverity_commands(args.language)
+    # In PR scope, capture and analyze only the files touched by the PR
+    pr_modified_files = None
+    pr_filter_stats = None
+    github_cache = ResponseCache(cache_dir=GITHUB_CACHE_DIR) if args.scan_scope == 'pr' else None
+    if args.scan_scope == 'pr' and not args.skip_analysis:
+        pr_modified_files = get_pr_modified_files(args.github_repo, pr_number, github_token, github_cache)
 
     # Read base branch from workspace
     base_branch = get_base_branch()
 
-    # Initialize JSON file
-    json_file_path = 'copilot_data.json'
+    # Run everything in a dedicated worktree, results and logs stay in the user's checkout
+    repo_dir = os.getcwd()
+    if args.workspace == 'worktree' and not args.skip_analysis:
+        workspace_settings["worktree"] = create_worktree(base_branch, args.worktree_dir)
+        os.chdir(workspace_settings["worktree"])
+
+    # Build one stage graph for all languages, sharing the host's cores between them
+    languages = [language for value in args.language for language in value.split(',') if language]
+    jobs = max(1, args.jobs // len(languages))
+    pipelines = load_coverity_commands(args.coverity_commands)
+    coverity_graph, json_reports, pr_capture = build_coverity_graph(pipelines, languages, jobs, pr_modified_files)
+    verify_stats = None
+    cluster_stats = {} if args.dedupe_threshold is not None else None
+
+    # Seed full captures from the idir of the closest cached commit, PR captures only hold the PR files
+    idir_cache = None
+    coverity_version = None
+    if not args.disable_idir_cache and not args.skip_analysis and not pr_capture:
+        coverity_version = get_coverity_version()
+        if coverity_version:
+            idir_cache = IdirCache(args.idir_cache_dir, args.idir_cache_entries)
+
+    # Initialize the issue store backed by the JSON file
+    json_file_path = os.path.join(repo_dir, 'copilot_data.json') if workspace_settings["worktree"] else 'copilot_data.json'
     if rerun == 0 and not args.skip_analysis:
-        with open(json_file_path, 'w') as json_file:
-            json.dump({"base_branch": base_branch, "issues": []}, json_file)
+        issue_store = IssueStore.create(json_file_path, base_branch)
+    elif os.path.exists(json_file_path):
+        issue_store = IssueStore.load(json_file_path)
+    else:
+        issue_store = IssueStore(json_file_path, {"base_branch": base_branch, "issues": []})
 
     if not args.skip_analysis:
         for rerun in range(args.rerun_count):
             logging.info(f"Scan run count: {rerun}")
-            setup_update_workspace(base_branch, json_file_path, rerun)
-
-            # Run Coverity commands
-            for command in coverity_commands:
-                run_command(command)
+            with tracing.span("setup_workspace", "git", rerun=rerun):
+                setup_update_workspace(base_branch, issue_store, rerun)
+            if rerun > 0 and args.verify_mode == 'incremental':
+                # Only the files touched by the fixes changed since the first scan
+                with tracing.span("verify_fixes", "coverity", rerun=rerun):
+                    verify_stats, still_present = verify_fixes(issue_store, pipelines, languages, jobs)
+                if not still_present:
+                    break
+                # Only the re-scan is incremental, still failing fixes get an alternate fix like in a full rerun
+                with tracing.span("generate_fixes", "llm", rerun=rerun):
+                    regenerate_failed_fixes(
+                        token_manager, still_present, issue_store, args.max_inflight, response_cache, args.batch_size
+                    )
+                continue
+            if pr_capture:
+                write_pr_file_list(pr_modified_files)
+
+            if idir_cache and (rerun == 0 or not workspace_settings["worktree"]):
+                # A worktree keeps its idir between reruns
+                with tracing.span("seed_idir_cache", "bookkeeping"):
+                    seed_idir_cache(idir_cache, coverity_version, languages, jobs)
+
+            # Run Coverity commands, independent stages in parallel
+            with tracing.span("coverity_graph", "coverity", rerun=rerun):
+                run_command_graph(coverity_graph, run_command, cancel=cancel_running_commands)
+            if idir_cache and rerun == 0:
+                # Only the first run scans the unmodified commit, later runs include fixes
+                with tracing.span("store_idir_cache", "bookkeeping"):
+                    store_idir_cache(idir_cache, coverity_version, languages, jobs)
 
             # Read and format issues from the JSON report
-            logging.info("Reading and formatting issues from the JSON report...")
-            formatted_issues = read_and_format_issues('local_report.json')
-            if formatted_issues:
-                for issue in formatted_issues:
-                    logging.info(issue)
-                    file_path, line_number, *_ = issue.split(':')
-                    line_number = int(line_number)
-                    line_content = get_line_from_file(file_path, line_number)
-                    rerun_fix = ""  # Initialize rerun_fix with a default value
-                    with open(json_file_path, 'r') as json_file:
-                        json_data = json.load(json_file)
-                        for json_issue in json_data["issues"]:
-                            if json_issue["file_name"] == file_path and json_issue["line_number"] == line_number:
-                                if json_issue["copilot_fixed"] == "false":
-                                    rerun_fix = f"This suggested_fix {json_issue['suggested_fix']} does not solve the issue. Provide an alternate fix."
-                                    break
-                    if line_content:
-                        logging.info(f"Line {line_number} from {file_path}: {line_content}")
-
-                        # Define the prompt template and parameters
-                        prompt_template = """
-                        Issue: {issue}
-                        Code with issue: {code_with_issue}
-                        {rerun_fix}
-                        Read the Coverity issue report and the code_with_issue. Act on the following:
-                        1. Generate a precise fix code snippet for fixing the issue while maintaining the original code style and indentation.
-                        2. Keep the fix relevant to the existing code without making assumptions beyond the provided context.
-                        3. Output should follow the structured JSON format with 'fix',
-                        4. Do not add unnecessary information. example: fix: "int x = 0; // Initialize x to 0 to avoid undefined behavior"
-                        5. The code must be functional and compilable in case of langauges that needs compilations
-                        6. Validate the generated JSON output to ensure correctness and proper formatting. Verify indentation and structure consistency and do not introduce unrelated changes.
-                        """
-                        prompt_input = prompt_template.format(issue=issue, code_with_issue=line_content, rerun_fix=rerun_fix)
-                        prompt_input = f'"{prompt_input}"'
-                        logging.info(f"Prompt input: {prompt_input}")
-
-                        # Call the GPT API
-                        gpt_response = call_gpt_api(access_token, prompt_input)
-                        logging.info("GPT API response:")
-                        logging.info(json.dumps(gpt_response, indent=4))
-                        currentResponse = gpt_response.get('currentResponse')
-                        logging.info(f"Suggestion fix: %s", currentResponse)
-                        currentResponse = currentResponse.strip('```json\n').strip('\n```')
-                        data = json.loads(currentResponse)
-                        fix_value = data["fix"]
-                        logging.info(fix_value)
-
-                        # Update JSON file with issue details
-                        with open(json_file_path, 'r+') as json_file:
-                            json_data = json.load(json_file)
-                            if rerun == 0:
-                                json_data["issues"].append({
-                                    "issue": issue,
-                                    "file_name": file_path,
-                                    "line_number": line_number,
-                                    "code_with_issue": line_content,
-                                    "suggested_fix": fix_value,
-                                    "copilot_fixed": "true"
-                                })
-                                modified_files.add(file_path)  # Add file_path to modified_files
-                            else:
-                                for json_issue in json_data["issues"]:
-                                    if json_issue["file_name"] == file_path and json_issue["line_number"] == line_number:
-                                        if json_issue["suggested_fix"] == line_content:
-                                            json_issue["copilot_fixed"] = "false"
-                                            break
-                            json_file.seek(0)
-                            json.dump(json_data, json_file, indent=4)
+            logging.info("Reading issues from the JSON report...")
+            report_issues = itertools.chain.from_iterable(read_issues(json_report) for json_report in json_reports)
+            if pr_modified_files:
+                # Drop issues outside the PR diff before any prompt is built
+                pr_filter_stats = {"skipped": 0}
+                report_issues = filter_issues_to_pr(
+                    report_issues, pr_modified_files, args.pr_line_radius, os.getcwd(), pr_filter_stats
+                )
+
+            with tracing.span("generate_fixes", "llm", rerun=rerun) as attributes:
+                if args.dedupe_threshold is not None:
+                    # Clustering needs every issue of the report before the first GPT call
+                    fix_results = generate_clustered_fixes(
+                        token_manager, iter_pending_issues(report_issues, issue_store), args.dedupe_threshold,
+                        args.max_inflight, response_cache, args.batch_size, cluster_stats
+                    )
+                else:
+                    # Generate the fixes concurrently while the report is streamed, results come back in issue order
+                    fix_results = generate_fixes(
+                        token_manager, iter_pending_issues(report_issues, issue_store), args.max_inflight, response_cache,
+                        args.batch_size
+                    )
+                attributes["issues"] = len(fix_results)
+            if pr_filter_stats:
+                logging.info(f"Skipped {pr_filter_stats['skipped']} issues outside the PR diff.")
+            if fix_results:
+                # Update the issue store with issue details
+                for (issue, line_content, rerun_fix), fix_value in fix_results:
+                    if rerun == 0:
+                        if fix_value is None:
+                            issue_store.add_issue(issue, line_content, "", copilot_fixed="false")
+                            continue
+                        issue_store.add_issue(issue, line_content, fix_value)
+                        modified_files.add(issue.file_path)  # Add file_path to modified_files
                     else:
-                        logging.error(f"Error reading line {line_number} from {file_path}")
-                        break
+                        for json_issue in issue_store.find(issue.file_path, issue.line_number):
+                            if json_issue["suggested_fix"] == line_content:
+                                json_issue["copilot_fixed"] = "false"
+                                issue_store.mark_dirty()
+                                break
+                # Checkpoint the results of this scan run
+                issue_store.flush()
             else:
                 logging.info("No new issues found in this scan run.")
                 break
 
             # Move untracked files and folders to original-scan-result folder only for the first result
             if modified_files and rerun == 0:
-                move_untracked_files()
+                with tracing.span("move_untracked_files", "bookkeeping"):
+                    if workspace_settings["worktree"]:
+                        move_untracked_files(os.path.join(repo_dir, 'original-scan-result'), copy=True)
+                    else:
+                        move_untracked_files()
                 if args.scan_scope == 'repo':
                     current_branch = get_current_branch()
                     if not current_branch.startswith('copilot-scan-'):
@@ -597,17 +1745,19 @@ def main():
     # Commit and push changes after all reruns are completed
     if args.scan_scope == 'repo' and modified_files:
         # Check if there are any suggested fixes to apply
-        if not has_suggested_fixes(json_file_path):
+        if not has_suggested_fixes(issue_store):
             logging.info("No fixes suggested by Copilot. Exiting the script.")
             sys.exit(0)
 
         logging.info("Current branch: %s", current_branch)
         logging.info("Changes done in files: %s", modified_files)
         # Ensure the workspace is ready with all updates for the upload
-        setup_update_workspace(new_branch_name, json_file_path, rerun)
+        with tracing.span("setup_workspace", "git", rerun=rerun):
+            setup_update_workspace(new_branch_name, issue_store, rerun)
         current_branch = get_current_branch()
         if current_branch.startswith('copilot-scan-'):
-            commit_and_push_changes(args.jira_id, current_branch, modified_files)
+            with tracing.span("commit_and_push", "git"):
+                commit_and_push_changes(args.jira_id, current_branch, modified_files)
         # Create a pull request after pushing changes
         pr_number = create_pull_request(
             repo=f"{args.github_repo}",
@@ -618,16 +1768,12 @@ def main():
             body="This PR contains the suggested fixes for Coverity issues."
         )
     elif args.scan_scope == 'pr':
-        modified_files = set()
-        with open(json_file_path, 'r') as json_file:
-            json_data = json.load(json_file)
-            for issue in json_data.get("issues", []):
-                if issue.get("copilot_fixed") == "true":
-                    modified_files.add(issue.get("file_name"))
+        modified_files = issue_store.fixed_files()
         logging.info("Changes done in files: %s", modified_files)
         if modified_files:
-            # Fetch modified files and lines in the PR
-            pr_modified_files = get_pr_modified_files(args.github_repo, pr_number, github_token)
+            # Fetch modified files and lines in the PR, unless already fetched for the capture
+            if pr_modified_files is None:
+                pr_modified_files = get_pr_modified_files(args.github_repo, pr_number, github_token, github_cache)
             logging.info("Modified files in the PR:")
             logging.info(pr_modified_files)
             if not pr_modified_files:
@@ -637,39 +1783,46 @@ def main():
             # Determine the repository root path
             repo_root = os.path.commonpath([os.getcwd()])
 
-            # Read copilot_data.json
-            with open(json_file_path, 'r') as json_file:
-                json_data = json.load(json_file)
-
             comments = []
-            for issue in json_data.get("issues", []):
+            for issue in issue_store.issues:
                 absolute_file_name = issue["file_name"]  # Absolute path
                 logging.info(f"Absolute file name: {absolute_file_name}")
                 relative_file_name = os.path.relpath(absolute_file_name, repo_root)  # Convert to relative path
                 logging.info(f"Relative file name: {relative_file_name}")
                 line_number = issue["line_number"]
                 suggested_fix = issue["suggested_fix"]
+                if not suggested_fix:
+                    continue
 
                 # Normalize paths for comparison
                 relative_file_name = relative_file_name.replace("\\", "/")  # Ensure consistent path separators
                 logging.info(f"Normalized relative file name: {relative_file_name}")
-                for pr_file, pr_lines in pr_modified_files.items():
-                    if not pr_lines:  # Handle newly added files
-                        pr_lines = list(range(1, len(open(pr_file).readlines()) + 1))
-                    if relative_file_name == pr_file and line_number in pr_lines:
-                        # Preserve the original indentation of the line
-                        original_line = open(pr_file).readlines()[line_number - 1]
-                        leading_spaces = len(original_line) - len(original_line.lstrip())
-                        indented_fix_lines = [' ' * leading_spaces + line for line in suggested_fix.split('\n')]
-
-                        # Format the suggestion with proper indentation
-                        formatted_suggestion = '\n'.join(indented_fix_lines)
-
-                        comments.append({
-                            'path': pr_file,
-                            'position': pr_lines.index(line_number) + 1,  # Position in the diff
-                            'body': f"Suggested fix:\n```suggestion\n{formatted_suggestion}\n```"
-                        })
+                pr_positions = pr_modified_files.get(relative_file_name)
+                if pr_positions is None:
+                    continue
+                if pr_positions:
+                    position = pr_positions.get(line_number)
+                elif line_number <= source_cache.line_count(relative_file_name):
+                    # No patch from GitHub, the file is handled as entirely added
+                    position = line_number
+                else:
+                    position = None
+                if position is None:
+                    continue
+
+                # Preserve the original indentation of the line
+                original_line = source_cache.get_line(relative_file_name, line_number)
+                leading_spaces = len(original_line) - len(original_line.lstrip())
+                indented_fix_lines = [' ' * leading_spaces + line for line in suggested_fix.split('\n')]
+
+                # Format the suggestion with proper indentation
+                formatted_suggestion = '\n'.join(indented_fix_lines)
+
+                comments.append({
+                    'path': relative_file_name,
+                    'position': position,  # Position in the diff
+                    'body': f"Suggested fix:\n```suggestion\n{formatted_suggestion}\n```"
+                })
 
             # Add comments to the PR
             logging.info("Comments to be added to the PR:")
@@ -684,31 +1837,40 @@ def main():
         logging.info("No changes found in the workspace to push or add suggestion to PR.")
 
     repo_name = args.github_repo.split("/")[-1]  # Extract the repository name
-    report_table = generate_report_table(json_file_path, start_time, repo_name)
+    cache_stats = None
+    if response_cache:
+        response_cache.evict()
+        cache_stats = response_cache.stats()
+    pr_skipped_issues = pr_filter_stats["skipped"] if pr_filter_stats else None
+    report_table = generate_report_table(
+        issue_store, start_time, repo_name, cache_stats, pr_skipped_issues, verify_stats, cluster_stats,
+        get_scheduler().stats()
+    )
 
     # Enhance the report table to include detailed issue information
     try:
-        with open(json_file_path, 'r') as json_file:
-            json_data = json.load(json_file)
-            issues = json_data.get("issues", [])
-            detailed_data = []
-            for idx, issue in enumerate(issues, start=1):
-                issue_parts = issue['issue'].split(':')
-                file_line = f"{issue_parts[0]}:{issue_parts[1]}"
-                issue_id = issue_parts[2]
-                file_line = f"{issue['file_name']}:{issue['line_number']}"
-                status = "Fix suggested" if issue.get("copilot_fixed") == "true" else "Unable to Fix"
-                suggested_fix = f"[View Suggestion](https://github.com/{args.github_repo}/pull/{args.pr_number}#discussion_r{issue.get('pr_comment_id', 'None')})" if issue.get("pr_comment_id") else "None"
-                detailed_data.append({
-                    "Issue Id": issue_id,
-                    "File:Line Number": file_line,
-                    "Agent verdict": status
-                })
-            df = pd.DataFrame(detailed_data)
-            detailed_report_table = df.to_markdown(index=False)
-            report_table += "\n\nDetailed Issue Report:\n" + detailed_report_table
+        issues = issue_store.issues
+        detailed_data = []
+        for idx, issue in enumerate(issues, start=1):
+            issue_id = issue.get("checker_name") or issue['issue'].split(':')[2]
+            file_line = f"{issue['file_name']}:{issue['line_number']}"
+            status = "Fix suggested" if issue.get("copilot_fixed") == "true" else "Unable to Fix"
+            suggested_fix = f"[View Suggestion](https://github.com/{args.github_repo}/pull/{args.pr_number}#discussion_r{issue.get('pr_comment_id', 'None')})" if issue.get("pr_comment_id") else "None"
+            detailed_data.append({
+                "Issue Id": issue_id,
+                "File:Line Number": file_line,
+                "Agent verdict": status
+            })
+        detailed_report_table = markdown_table(detailed_data)
+        report_table += "\n\nDetailed Issue Report:\n" + detailed_report_table
     except Exception as e:
         logging.error(f"Error generating detailed issue report: {e}")
+    timings_table = generate_timings_table()
+    if report_table and timings_table:
+        report_table += "\n\nStage Timings:\n" + timings_table
+    breakdown_table = generate_stage_breakdown_table()
+    if report_table and breakdown_table:
+        report_table += "\n\nStage Breakdown:\n" + breakdown_table
     if report_table:
         logging.info("\nExecution Report:\n" + report_table)
         # Add the report table as a comment to the PR
@@ -0,0 +1,129 @@
+import re
+import json
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ISSUES_ARRAY_PATTERN = re.compile(r'"issues"\s*:\s*\[')
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+class Issue:
+    """
+    Compact record of one Coverity finding from a v9 JSON report.
+
+    events is a tuple of (eventDescription, remediation) pairs taken from the
+    top level events of the issue.
+    """
+    __slots__ = (
+        'merge_key', 'file_path', 'line_number', 'column_number', 'checker',
+        'language', 'function', 'events'
+    )
+
+    def __init__(self, merge_key, file_path, line_number, column_number, checker, language, function, events):
+        self.merge_key = merge_key
+        self.file_path = file_path
+        self.line_number = line_number
+        self.column_number = column_number
+        self.checker = checker
+        self.language = language
+        self.function = function
+        self.events = events
+
+    @classmethod
+    def from_v9(cls, issue):
+        events = tuple(
+            (event.get('eventDescription'), event.get('remediation') == True)
+            for event in issue.get('events') or []
+        )
+        return cls(
+            merge_key=issue.get('mergeKey'),
+            file_path=issue.get('mainEventFilePathname'),
+            line_number=issue.get('mainEventLineNumber'),
+            column_number=issue.get('mainEventColumnNumber'),
+            checker=issue.get('checkerName'),
+            language=issue.get('language'),
+            function=issue.get('functionDisplayName'),
+            events=events
+        )
+
+    @property
+    def has_remediation(self):
+        return any(remediation for _, remediation in self.events)
+
+    def event_descriptions(self):
+        return ' '.join(
+            f"Recommended_Remediation: {description}" if remediation else f"{description}"
+            for description, remediation in self.events
+        )
+
+    def __str__(self):
+        # Same "path:line:checker:language:events" text the prompt and copilot_data.json have always used
+        return f"{self.file_path}:{self.line_number}:{self.checker}:{self.language}:{self.event_descriptions()}"
+
+    def __repr__(self):
+        return f"Issue({self.merge_key!r}, {self.file_path!r}, {self.line_number!r}, {self.checker!r})"
+
+def iter_report_issues(json_report_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yields the issue objects of a cov-format-errors --json-output-v9 report one at a time.
+
+    Only the issue currently being decoded is kept in memory, so peak memory does
+    not depend on the size of the report.
+
+    Args:
+        json_report_file (str): Path of the v9 JSON report.
+        chunk_size (int): Number of characters read from the file at a time.
+
+    Yields:
+        dict: One entry of the top level "issues" array.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_report_file, 'r') as file:
+        buffer = ''
+        eof = False
+
+        def read_more():
+            nonlocal buffer, eof
+            chunk = file.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer += chunk
+
+        # Skip the report header up to the start of the issues array
+        while True:
+            match = ISSUES_ARRAY_PATTERN.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+            if eof:
+                return
+            # Keep a short tail in case the key is split across two chunks
+            buffer = buffer[-32:]
+            read_more()
+
+        pos = 0
+        while True:
+            # Skip separators between issues
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    raise ValueError(f"Unexpected end of report {json_report_file} inside the issues array")
+                buffer = ''
+                pos = 0
+                read_more()
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                issue, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The issue is not complete yet, drop what was consumed and read further
+                buffer = buffer[pos:]
+                pos = 0
+                read_more()
+                continue
+            yield issue
+            pos = end
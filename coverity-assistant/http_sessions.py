@@ -0,0 +1,69 @@
+import threading
+import logging
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 16
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_pool_settings = {
+    "pool_connections": DEFAULT_POOL_CONNECTIONS,
+    "pool_maxsize": DEFAULT_POOL_MAXSIZE
+}
+
+def configure_pools(pool_connections=None, pool_maxsize=None):
+    """
+    Sets the connection pool sizes used by sessions created after this call.
+
+    Args:
+        pool_connections (int): Number of per-host connection pools kept by each session.
+        pool_maxsize (int): Maximum number of keep-alive connections per pool.
+    """
+    with _sessions_lock:
+        if pool_connections:
+            _pool_settings["pool_connections"] = pool_connections
+        if pool_maxsize:
+            _pool_settings["pool_maxsize"] = pool_maxsize
+
+def get_session(url, proxy=None):
+    """
+    Returns the shared keep-alive session for the scheme and host of url.
+
+    Sessions are created once per (scheme, host, proxy) and reused by every caller,
+    so TCP/TLS connections through the proxy are pooled across requests and threads.
+
+    Args:
+        url (str): Any URL on the target host.
+        proxy (Proxy): Optional proxy applied to the session when it is created.
+
+    Returns:
+        requests.Session: The pooled session.
+    """
+    parts = urlsplit(url)
+    proxies = proxy.proxies if proxy else None
+    key = (parts.scheme, parts.netloc, tuple(sorted(proxies.items())) if proxies else None)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            logging.info(f"Creating HTTP session for {parts.scheme}://{parts.netloc}")
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=_pool_settings["pool_connections"],
+                pool_maxsize=_pool_settings["pool_maxsize"]
+            )
+            session.mount(f"{parts.scheme}://", adapter)
+            if proxies:
+                session.proxies.update(proxies)
+            _sessions[key] = session
+        return session
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
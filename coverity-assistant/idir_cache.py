@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class IdirCache:
+    """
+    On-disk cache of Coverity intermediate directories and configurations kept
+    outside the work tree, so they survive the git clean done before every scan.
+
+    Entries are grouped by toolchain, i.e. the Coverity version and the language,
+    and by work tree, since an idir records the absolute paths of its sources and
+    cannot be reused from another checkout. They are named by the commit they were
+    captured at. A scan seeds its idir from the entry of the closest ancestor commit
+    and lets Coverity capture the delta.
+    """
+    def __init__(self, cache_dir=None, max_entries=4):
+        """
+        Args:
+            cache_dir (str): Location of the cache, defaults to ~/.cache/coverity-assistant/idir.
+            max_entries (int): Number of commits kept per toolchain, least recently used are evicted.
+        """
+        self.cache_dir = cache_dir if cache_dir else os.path.join(os.path.expanduser('~'), '.cache', 'coverity-assistant', 'idir')
+        self.max_entries = max_entries
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def toolchain_key(coverity_version, language, work_tree):
+        work_tree = os.path.realpath(work_tree)
+        return hashlib.sha256(json.dumps([coverity_version, language, work_tree]).encode('utf-8')).hexdigest()
+
+    def _entry_path(self, toolchain_key, commit):
+        return os.path.join(self.cache_dir, toolchain_key, commit)
+
+    def lookup(self, toolchain_key, commits):
+        """
+        Returns (commit, entry path) of the first of commits with a cache entry, or (None, None).
+
+        Args:
+            toolchain_key (str): Result of toolchain_key.
+            commits (list): Candidate commits, closest first, e.g. from git rev-list HEAD.
+        """
+        for commit in commits:
+            entry_path = self._entry_path(toolchain_key, commit)
+            if os.path.isfile(os.path.join(entry_path, 'meta.json')):
+                # Touch the entry so eviction keeps recently used commits
+                os.utime(entry_path, None)
+                return commit, entry_path
+        return None, None
+
+    def seed(self, entry_path, paths):
+        """
+        Replaces paths in the work tree with their cached copies.
+
+        Args:
+            entry_path (str): Entry returned by lookup.
+            paths (list): Work tree directories to restore, e.g. idir and coverity_config.
+        """
+        for path in paths:
+            cached_path = os.path.join(entry_path, path)
+            if not os.path.isdir(cached_path):
+                continue
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            shutil.copytree(cached_path, path, symlinks=True)
+
+    def store(self, toolchain_key, commit, paths):
+        """
+        Copies paths into the entry of commit, replacing any previous entry, then evicts old entries.
+        """
+        group_dir = os.path.join(self.cache_dir, toolchain_key)
+        entry_path = self._entry_path(toolchain_key, commit)
+        try:
+            os.makedirs(group_dir, exist_ok=True)
+            tmp_path = tempfile.mkdtemp(dir=group_dir, prefix='.tmp-')
+            try:
+                for path in paths:
+                    if os.path.isdir(path):
+                        shutil.copytree(path, os.path.join(tmp_path, path), symlinks=True)
+                with open(os.path.join(tmp_path, 'meta.json'), 'w') as meta_file:
+                    json.dump({"commit": commit, "paths": paths, "created": time.time()}, meta_file)
+                if os.path.exists(entry_path):
+                    shutil.rmtree(entry_path)
+                os.rename(tmp_path, entry_path)
+            except Exception:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                raise
+        except OSError as e:
+            logging.error(f"Failed to store Coverity idir cache entry {commit}: {e}")
+            return
+        logging.info(f"Stored Coverity idir cache entry for commit {commit}")
+        self.evict(toolchain_key)
+
+    def evict(self, toolchain_key):
+        group_dir = os.path.join(self.cache_dir, toolchain_key)
+        entries = []
+        for name in os.listdir(group_dir):
+            path = os.path.join(group_dir, name)
+            if name.startswith('.tmp-'):
+                continue
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            shutil.rmtree(path, ignore_errors=True)
@@ -2,13 +2,17 @@ import requests
 import time
 import logging
 from proxy import Proxy
+from http_sessions import get_session
+from request_scheduler import get_scheduler
+from token_manager import TokenManager
  
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
  
 class IgptAPIClient:
     def __init__(
         self, client_id, client_secret, proxy_url= None, auth_url=None,
-        api_url=None, api_url_stream=None, api_url_embed=None, disable_proxy=False
+        api_url=None, api_url_stream=None, api_url_embed=None, disable_proxy=False,
+        token_cache_path=None
     ):
         self.client_id = client_id
         self.client_secret = client_secret
@@ -20,8 +24,13 @@ class IgptAPIClient:
         self.access_token = None
         self.access_token_expires_on = None
         self.proxy = None if disable_proxy else Proxy(self.proxy_url)
+        self.token_manager = TokenManager(
+            self._request_access_token,
+            f"{self.auth_url}:{self.client_id}",
+            cache_path=token_cache_path
+        )
  
-    def get_access_token(self):
+    def _request_access_token(self):
         data = {
             'grant_type': 'client_credentials'
         }
@@ -29,35 +38,41 @@ class IgptAPIClient:
             'Content-Type': 'application/x-www-form-urlencoded'
         }
         try:
-            response = requests.post(
-                self.auth_url,
+            response = get_scheduler().request(
+                get_session(self.auth_url, self.proxy), 'post', self.auth_url,
                 data=data,
                 headers=headers,
-                auth=(self.client_id, self.client_secret),
-                proxies=self.proxy.proxies if self.proxy else None
+                auth=(self.client_id, self.client_secret)
             )
             response.raise_for_status()
             response_json = response.json()
-            logging.info("%s", response_json)
-            self.access_token_expires_on = int(response_json.get('expires_in')) + time.time() - 60
-            self.access_token = response_json.get('access_token')
+            access_token_expires_on = int(response_json.get('expires_in')) + time.time() - 60
+            access_token = response_json.get('access_token')
+            if not access_token:
+                raise ValueError("No access_token in the auth response.")
+            logging.info("Access token obtained.")
+            return access_token, access_token_expires_on
         except requests.exceptions.RequestException as e:
             logging.error(f"Failed to get access token: {e}")
             raise
+
+    def get_access_token(self):
+        self.token_manager.refresh()
+        self.access_token = self.token_manager.access_token
+        self.access_token_expires_on = self.token_manager.access_token_expires_on
  
     def process_request(self, json_data):
-        self.check_access_token()
+        access_token = self.check_access_token()
         headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.access_token}"
+            "Authorization": f"Bearer {access_token}"
         }
         try:
             logging.info("1.Processing request %s",self.api_url)
-            response = requests.post(
-                self.api_url,
+            response = get_scheduler().request(
+                get_session(self.api_url, self.proxy), 'post', self.api_url,
                 headers=headers,
-                json=json_data,
-                proxies=self.proxy.proxies if self.proxy else None
+                json=json_data
             )
             response.raise_for_status()
             return response
@@ -66,17 +81,16 @@ class IgptAPIClient:
             raise
  
     def process_request_stream(self, json_data):
-        self.check_access_token()
+        access_token = self.check_access_token()
         headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.access_token}"
+            "Authorization": f"Bearer {access_token}"
         }
         try:
-            response = requests.post(
-                self.api_url_stream,
+            response = get_scheduler().request(
+                get_session(self.api_url_stream, self.proxy), 'post', self.api_url_stream,
                 headers=headers,
                 json=json_data,
-                proxies=self.proxy.proxies if self.proxy else None,
                 stream=True
             )
             response.raise_for_status()
@@ -88,21 +102,22 @@ class IgptAPIClient:
             raise
  
     def check_access_token(self):
-        if self.access_token is None or (self.access_token_expires_on and self.access_token_expires_on <= time.time()):
-            self.get_access_token()
+        # The token manager refreshes ahead of expiry in the background, this is a plain read
+        self.access_token = self.token_manager.get_token()
+        self.access_token_expires_on = self.token_manager.access_token_expires_on
+        return self.access_token
  
     def process_request_embed(self, json_data):
-        self.check_access_token()
+        access_token = self.check_access_token()
         headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.access_token}"
+            "Authorization": f"Bearer {access_token}"
         }
         try:
-            response = requests.post(
-                self.api_url_embed,
+            response = get_scheduler().request(
+                get_session(self.api_url_embed, self.proxy), 'post', self.api_url_embed,
                 headers=headers,
-                json=json_data,
-                proxies=self.proxy.proxies if self.proxy else None
+                json=json_data
             )
             response.raise_for_status()
             return response
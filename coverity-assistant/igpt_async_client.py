@@ -0,0 +1,213 @@
+import time
+import asyncio
+import contextlib
+import logging
+import requests
+from proxy import Proxy
+from http_sessions import get_session
+from request_scheduler import get_scheduler
+from token_manager import TokenManager
+
+try:
+    import aiohttp
+except ImportError:  # Only needed by callers of the async client
+    aiohttp = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class AsyncIgptAPIClient:
+    """
+    asyncio counterpart of IgptAPIClient with the same endpoints and token handling.
+
+    All requests share one aiohttp connection pool and at most max_concurrency of
+    them are in flight at a time, so a single event loop can drive hundreds of
+    inference and embedding requests without a thread each. Requests go through
+    the shared RequestScheduler for rate limiting and retries, and tokens come from
+    the same TokenManager cache as the synchronous client.
+
+    Use it as an async context manager, or call close when done.
+    """
+    def __init__(
+        self, client_id, client_secret, proxy_url=None, auth_url=None,
+        api_url=None, api_url_stream=None, api_url_embed=None, disable_proxy=False,
+        token_cache_path=None, max_concurrency=100, pool_size=100
+    ):
+        if aiohttp is None:
+            raise ImportError("AsyncIgptAPIClient requires the aiohttp package")
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.proxy_url = proxy_url if proxy_url else "http://proxy-chain.intel.com:912"
+        self.auth_url = auth_url if auth_url else "https://apis-internal.intel.com/v1/auth/token"
+        self.api_url = api_url if api_url else 'https://intel-prod.apigee.com/generativeaiinference/v2'
+        self.api_url_stream = api_url_stream if api_url_stream else 'https://intel-prod.apigee.com/generativeaiinference/v2/stream'
+        self.api_url_embed = api_url_embed if api_url_embed else 'https://apis-internal.intel.com/generativeaiembedding/v1/embed'
+        self.access_token = None
+        self.access_token_expires_on = None
+        self.proxy = None if disable_proxy else Proxy(self.proxy_url)
+        self.pool_size = pool_size
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.session = None
+        self.token_manager = TokenManager(
+            self._request_access_token,
+            f"{self.auth_url}:{self.client_id}",
+            cache_path=token_cache_path
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+    def _session(self):
+        if self.session is None or self.session.closed:
+            scheduler = get_scheduler()
+            connect_timeout, read_timeout = scheduler.timeout
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _request_access_token(self):
+        # Called by the token manager from a worker or refresh thread, never on the event loop
+        data = {
+            'grant_type': 'client_credentials'
+        }
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        try:
+            response = get_scheduler().request(
+                get_session(self.auth_url, self.proxy), 'post', self.auth_url,
+                data=data,
+                headers=headers,
+                auth=(self.client_id, self.client_secret)
+            )
+            response.raise_for_status()
+            response_json = response.json()
+            access_token_expires_on = int(response_json.get('expires_in')) + time.time() - 60
+            access_token = response_json.get('access_token')
+            if not access_token:
+                raise ValueError("No access_token in the auth response.")
+            logging.info("Access token obtained.")
+            return access_token, access_token_expires_on
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Failed to get access token: {e}")
+            raise
+
+    async def get_access_token(self):
+        await asyncio.to_thread(self.token_manager.refresh)
+        self.access_token = self.token_manager.access_token
+        self.access_token_expires_on = self.token_manager.access_token_expires_on
+
+    async def check_access_token(self):
+        token_manager = self.token_manager
+        if token_manager.access_token and token_manager.access_token_expires_on > time.time():
+            self.access_token = token_manager.get_token()
+        else:
+            # Fetching or loading the token blocks, keep it off the event loop
+            self.access_token = await asyncio.to_thread(token_manager.get_token)
+        self.access_token_expires_on = self.token_manager.access_token_expires_on
+        return self.access_token
+
+    def _send(self, session, url, **kwargs):
+        return _ScheduledRequest(session, url, self.proxy.proxies['https'] if self.proxy else None, kwargs)
+
+    async def _post_json(self, url, json_data):
+        access_token = await self.check_access_token()
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {access_token}"
+        }
+        async with self.semaphore:
+            try:
+                async with self._send(self._session(), url, headers=headers, json=json_data) as response:
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.error(f"Failed to process request: {e}")
+                raise
+
+    async def process_request(self, json_data):
+        """
+        Returns the decoded JSON response of the inference endpoint.
+        """
+        return await self._post_json(self.api_url, json_data)
+
+    async def process_request_stream(self, json_data):
+        """
+        Yields the raw chunks of the streaming inference endpoint as they arrive.
+
+        The concurrency slot is held only until the response headers arrive, so a
+        consumer that stops iterating without closing the generator does not keep
+        it until the generator is garbage collected.
+        """
+        access_token = await self.check_access_token()
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {access_token}"
+        }
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                async with self.semaphore:
+                    response = await stack.enter_async_context(
+                        self._send(self._session(), self.api_url_stream, headers=headers, json=json_data)
+                    )
+                    response.raise_for_status()
+                async for chunk in response.content.iter_any():
+                    if chunk:
+                        yield chunk
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error(f"Failed to process request: {e}")
+            raise
+
+    async def process_request_embed(self, json_data):
+        """
+        Returns the decoded JSON response of the embedding endpoint.
+        """
+        return await self._post_json(self.api_url_embed, json_data)
+
+class _ScheduledRequest:
+    """
+    Async context manager posting one request through the shared RequestScheduler,
+    waiting for rate limit slots and retrying with asyncio.sleep instead of blocking.
+    """
+    def __init__(self, session, url, proxy, kwargs):
+        self.session = session
+        self.url = url
+        self.proxy = proxy
+        self.kwargs = kwargs
+        self.response = None
+
+    async def __aenter__(self):
+        scheduler = get_scheduler()
+        attempt = 0
+        while True:
+            wait = scheduler.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await self.session.post(self.url, proxy=self.proxy, **self.kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                delay = scheduler.retry_delay(self.url, attempt, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = scheduler.retry_delay(self.url, attempt, response.status, response.headers.get('Retry-After'))
+                if delay is None:
+                    self.response = response
+                    return response
+                response.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.response.release()
+        return False
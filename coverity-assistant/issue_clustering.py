@@ -0,0 +1,94 @@
+import re
+import math
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+TOKEN_PATTERN = re.compile(r'\w+|\S')
+IDENTIFIER_PATTERN = re.compile(r'^\w+$')
+
+def embedding_text(issue, line_content):
+    return f"{issue.checker}\n{issue.event_descriptions()}\n{line_content.strip()}"
+
+def _normalize(vector):
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else vector
+
+def _cosine(normalized_a, normalized_b):
+    return sum(a * b for a, b in zip(normalized_a, normalized_b))
+
+def cluster_issues(pending_issues, embed=None, threshold=0.95):
+    """
+    Groups pending issues that can share one generated fix.
+
+    Issues are first grouped by exact mergeKey. The groups are then merged when the
+    embeddings of their (checker, event descriptions, code line) text have a cosine
+    similarity of at least threshold. Only groups of the same checker are compared.
+
+    Args:
+        pending_issues (list): Tuples of (issue, line_content, rerun_fix).
+        embed (callable): Returns one embedding vector per text, or None to group by mergeKey only.
+        threshold (float): Minimum cosine similarity to join a cluster.
+
+    Returns:
+        tuple: (clusters, number of mergeKey groups). Each cluster is a list of indices
+        into pending_issues, its first index being the issue the fix is generated for.
+    """
+    groups = {}
+    for index, (issue, line_content, rerun_fix) in enumerate(pending_issues):
+        # Issues already rejected once get their own prompt with the rejected fix
+        key = (issue.merge_key, rerun_fix) if issue.merge_key else ("index", index)
+        groups.setdefault(key, []).append(index)
+    groups = list(groups.values())
+    if embed is None or len(groups) < 2:
+        return groups, len(groups)
+
+    texts = [embedding_text(pending_issues[group[0]][0], pending_issues[group[0]][1]) for group in groups]
+    try:
+        vectors = [_normalize(vector) for vector in embed(texts)]
+    except Exception as e:
+        logging.error(f"Failed to embed issues, clustering by mergeKey only: {e}")
+        return groups, len(groups)
+
+    clusters = []
+    leaders = {}
+    for group, vector in zip(groups, vectors):
+        issue, _, rerun_fix = pending_issues[group[0]]
+        candidates = leaders.setdefault((issue.checker, rerun_fix), [])
+        for cluster, leader_vector in candidates:
+            if _cosine(vector, leader_vector) >= threshold:
+                cluster.extend(group)
+                break
+        else:
+            cluster = list(group)
+            clusters.append(cluster)
+            candidates.append((cluster, vector))
+    return clusters, len(groups)
+
+def adapt_fix(leader_line, member_line, fix_value):
+    """
+    Rewrites the fix generated for leader_line so it applies to member_line.
+
+    The two lines must have the same token structure and differ only in identifiers
+    or literals, e.g. gets(buf) and gets(line); the differing tokens are substituted
+    in the fix.
+
+    Returns:
+        str: The adapted fix, or None when the lines differ in structure.
+    """
+    leader_tokens = TOKEN_PATTERN.findall(leader_line)
+    member_tokens = TOKEN_PATTERN.findall(member_line)
+    if len(leader_tokens) != len(member_tokens):
+        return None
+    mapping = {}
+    for leader_token, member_token in zip(leader_tokens, member_tokens):
+        if leader_token == member_token:
+            continue
+        if not IDENTIFIER_PATTERN.match(leader_token) or not IDENTIFIER_PATTERN.match(member_token):
+            return None
+        if mapping.setdefault(leader_token, member_token) != member_token:
+            return None
+    if not mapping:
+        return fix_value
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(token) for token in mapping) + r')\b')
+    return pattern.sub(lambda match: mapping[match.group(0)], fix_value)
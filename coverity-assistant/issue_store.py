@@ -0,0 +1,106 @@
+import os
+import json
+import logging
+import tempfile
+import tracing
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class IssueStore:
+    """
+    In-memory view of copilot_data.json indexed by (file, line) and mergeKey.
+
+    Lookups and updates only touch memory; flush writes the whole document
+    atomically and is meant to be called at checkpoints, not per issue.
+    """
+    def __init__(self, json_file_path, data=None):
+        self.json_file_path = json_file_path
+        self.data = data if data is not None else {"base_branch": None, "issues": []}
+        self.dirty = False
+        self._by_location = {}
+        self._by_merge_key = {}
+        for issue in self.data["issues"]:
+            self._index(issue)
+
+    @classmethod
+    def create(cls, json_file_path, base_branch):
+        store = cls(json_file_path, {"base_branch": base_branch, "issues": []})
+        store.dirty = True
+        store.flush()
+        return store
+
+    @classmethod
+    def load(cls, json_file_path):
+        try:
+            with open(json_file_path, 'r') as json_file:
+                return cls(json_file_path, json.load(json_file))
+        except Exception as e:
+            logging.error(f"Error loading issue store from {json_file_path}: {e}")
+            raise
+
+    @property
+    def issues(self):
+        return self.data["issues"]
+
+    def _index(self, issue):
+        self._by_location.setdefault((issue["file_name"], issue["line_number"]), []).append(issue)
+        merge_key = issue.get("merge_key")
+        if merge_key:
+            self._by_merge_key.setdefault(merge_key, []).append(issue)
+
+    def add(self, issue):
+        self.data["issues"].append(issue)
+        self._index(issue)
+        self.dirty = True
+
+    def add_issue(self, issue, code_with_issue, suggested_fix, copilot_fixed="true"):
+        """
+        Records a fix generated for an Issue record.
+        """
+        self.add({
+            "issue": str(issue),
+            "merge_key": issue.merge_key,
+            "checker_name": issue.checker,
+            "function": issue.function,
+            "file_name": issue.file_path,
+            "line_number": issue.line_number,
+            "column_number": issue.column_number,
+            "code_with_issue": code_with_issue,
+            "suggested_fix": suggested_fix,
+            "copilot_fixed": copilot_fixed
+        })
+
+    def find(self, file_name, line_number):
+        return self._by_location.get((file_name, line_number), [])
+
+    def find_by_merge_key(self, merge_key):
+        return self._by_merge_key.get(merge_key, [])
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def has_suggested_fixes(self):
+        return any(issue.get("copilot_fixed") == "true" for issue in self.issues)
+
+    def fixed_files(self):
+        return {issue.get("file_name") for issue in self.issues if issue.get("copilot_fixed") == "true"}
+
+    def flush(self):
+        """
+        Writes the store to disk through a temporary file and an atomic rename.
+        """
+        if not self.dirty:
+            return
+        directory = os.path.dirname(os.path.abspath(self.json_file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.copilot_data.', suffix='.tmp')
+        try:
+            with tracing.span("issue_store_flush", "bookkeeping", issues=len(self.issues)):
+                with os.fdopen(fd, 'w') as json_file:
+                    json.dump(self.data, json_file, indent=4)
+                os.replace(tmp_path, self.json_file_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.dirty = False
+        logging.info(f"Flushed {len(self.issues)} issues to {self.json_file_path}")
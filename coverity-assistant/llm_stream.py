@@ -0,0 +1,104 @@
+import re
+import json
+import codecs
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+FIELD_PATTERN_TEMPLATE = r'"{field}"\s*:\s*"'
+
+def iter_stream_text(chunks):
+    """
+    Yields the text of a streamed GPT response as it arrives.
+
+    chunks are the raw bytes of the response body. Server-sent event lines
+    ("data: {...}") are unwrapped to the text of their currentResponse or content
+    field, anything else is passed through as plain model output.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ''
+    event_stream = None
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if event_stream is None:
+            pending += text
+            if not pending.lstrip():
+                continue
+            event_stream = pending.lstrip().startswith('data:')
+            text, pending = pending, ''
+        if not event_stream:
+            yield text
+            continue
+        pending += text
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            event_text = _event_text(line)
+            if event_text:
+                yield event_text
+    if event_stream and pending:
+        event_text = _event_text(pending)
+        if event_text:
+            yield event_text
+
+def _event_text(line):
+    line = line.strip()
+    if not line.startswith('data:'):
+        return None
+    data = line[len('data:'):].strip()
+    if not data or data == '[DONE]':
+        return None
+    try:
+        event = json.loads(data)
+    except ValueError:
+        return data
+    if isinstance(event, dict):
+        return event.get('currentResponse') or event.get('content') or ''
+    return event if isinstance(event, str) else ''
+
+class JsonStringFieldParser:
+    """
+    Incrementally extracts one string field of a JSON object from streamed model output.
+
+    Text is fed as it arrives and value is set as soon as the closing quote of the
+    field is seen, so the caller can stop reading the rest of the generation.
+    Markdown fences or text around the object do not matter.
+    """
+    def __init__(self, field='fix'):
+        self.field_pattern = re.compile(FIELD_PATTERN_TEMPLATE.format(field=re.escape(field)))
+        self.buffer = ''
+        self.start = None
+        self.scan_position = 0
+        self.value = None
+
+    @property
+    def done(self):
+        return self.value is not None
+
+    def feed(self, text):
+        """
+        Returns True once the field value is complete.
+        """
+        if self.done:
+            return True
+        self.buffer += text
+        if self.start is None:
+            match = self.field_pattern.search(self.buffer)
+            if not match:
+                return False
+            # The opening quote is kept so the literal can be decoded by json.loads
+            self.start = match.end() - 1
+            self.scan_position = match.end()
+        position = self.scan_position
+        while position < len(self.buffer):
+            character = self.buffer[position]
+            if character == '\\':
+                if position + 1 >= len(self.buffer):
+                    break
+                position += 2
+                continue
+            if character == '"':
+                self.value = json.loads(self.buffer[self.start:position + 1])
+                return True
+            position += 1
+        self.scan_position = position
+        return False
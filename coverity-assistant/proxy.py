@@ -0,0 +1,6 @@
+class Proxy:
+    def __init__(self, proxy_url):
+        self.proxies = {
+            'http': proxy_url,
+            'https': proxy_url
+        }
\ No newline at end of file
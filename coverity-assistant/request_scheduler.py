@@ -0,0 +1,156 @@
+import time
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class RequestScheduler:
+    """
+    Sends HTTP requests through a token bucket rate limit with retries.
+
+    Requests failing with a connection error, a timeout or a 429/5xx status are
+    retried with jittered exponential backoff, or after the Retry-After delay when
+    the server sends one. A Retry-After also holds back every other request of the
+    scheduler, since the limit is shared by the whole gateway.
+    """
+    def __init__(self, rate=None, burst=None, max_retries=5, backoff_base=1.0, backoff_max=60.0,
+                 connect_timeout=10, read_timeout=300):
+        """
+        Args:
+            rate (float): Requests per second, None for no rate limit.
+            burst (int): Requests that can be sent at once before the rate applies, defaults to rate.
+            max_retries (int): Retries of a request before its error is returned or raised.
+            backoff_base (float): Delay in seconds of the first retry, doubled on every further retry.
+            backoff_max (float): Upper bound of a single retry delay in seconds.
+            connect_timeout (float): Seconds to establish a connection.
+            read_timeout (float): Seconds to wait for data from the server.
+        """
+        self.rate = rate
+        self.burst = burst if burst else max(1, int(rate or 1))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = (connect_timeout, read_timeout)
+        self.lock = threading.Lock()
+        self.tokens = float(self.burst)
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.counters = {"requests": 0, "retries": 0, "throttle_waits": 0, "throttle_wait_seconds": 0.0, "failures": 0}
+
+    def request(self, session, method, url, **kwargs):
+        """
+        Sends one request through session, retrying it as needed.
+
+        Returns:
+            requests.Response: The last response, which may still carry an error status.
+
+        Raises:
+            requests.exceptions.RequestException: The last connection error or timeout.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            wait = self.reserve()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                delay = self.retry_delay(url, attempt, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = self.retry_delay(url, attempt, response.status_code, response.headers.get('Retry-After'))
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def retry_delay(self, url, attempt, status=None, retry_after=None, error=None):
+        """
+        Returns the seconds to wait before retrying a request that got status or raised
+        error, or None if it must not be retried. Also updates the counters.
+        """
+        if error is None and status not in RETRY_STATUSES:
+            return None
+        if attempt >= self.max_retries:
+            self._count("failures")
+            return None
+        if error is not None:
+            delay = self._backoff(attempt)
+            logging.warning(f"Request to {url} failed ({error}), retrying in {delay:.1f}s")
+        else:
+            retry_after = parse_retry_after(retry_after)
+            delay = retry_after if retry_after is not None else self._backoff(attempt)
+            if status == 429 or retry_after is not None:
+                with self.lock:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            logging.warning(f"Request to {url} returned {status}, retrying in {delay:.1f}s")
+        self._count("retries")
+        return delay
+
+    def reserve(self):
+        """
+        Takes a slot for one request and returns the seconds the caller must wait before sending it.
+        """
+        now = time.monotonic()
+        with self.lock:
+            wait = max(0.0, self.blocked_until - now)
+            if self.rate:
+                self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                # Reserve a token, going negative makes later callers queue behind this one
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+            self.counters["requests"] += 1
+            if wait > 0:
+                self.counters["throttle_waits"] += 1
+                self.counters["throttle_wait_seconds"] += wait
+        return wait
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+def parse_retry_after(value):
+    """
+    Returns the delay in seconds of a Retry-After header, given in seconds or as an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+_scheduler = RequestScheduler()
+
+def configure_scheduler(**settings):
+    """
+    Replaces the shared scheduler, settings are the RequestScheduler arguments.
+    """
+    global _scheduler
+    _scheduler = RequestScheduler(**settings)
+
+def get_scheduler():
+    return _scheduler
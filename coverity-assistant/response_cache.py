@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class ResponseCache:
+    """
+    On-disk cache of parsed LLM fixes, or of other JSON responses, one JSON file per key.
+
+    Entries older than max_age seconds are dropped, and once the cache grows past
+    max_bytes the least recently used entries are evicted first.
+    """
+    def __init__(self, cache_dir=None, max_age=7 * 24 * 3600, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir if cache_dir else os.path.join(os.path.expanduser('~'), '.cache', 'coverity-assistant', 'llm')
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(merge_key, checker_name, code_context, prompt_version, model_options):
+        context_hash = hashlib.sha256(code_context.encode('utf-8')).hexdigest()
+        key_data = json.dumps(
+            [merge_key, checker_name, context_hash, prompt_version, model_options],
+            sort_keys=True
+        )
+        return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        path = self._entry_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'r') as cache_file:
+                value = json.load(cache_file)["value"]
+            # Touch the entry so eviction keeps recently used fixes
+            os.utime(path, None)
+        except (OSError, ValueError, KeyError):
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as cache_file:
+                json.dump({"created": time.time(), "value": value}, cache_file)
+            os.replace(tmp_path, self._entry_path(key))
+        except OSError as e:
+            logging.error(f"Failed to write response cache entry {key} in {self.cache_dir}: {e}")
+
+    def evict(self):
+        """
+        Removes expired entries and trims the cache to max_bytes, oldest first.
+        """
+        now = time.time()
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+        entries.sort()
+        while entries and total_size > self.max_bytes:
+            _, size, path = entries.pop(0)
+            self._remove(path)
+            total_size -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logging.error(f"Failed to evict response cache entry {path}: {e}")
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
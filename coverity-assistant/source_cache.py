@@ -0,0 +1,78 @@
+import os
+import mmap
+import logging
+import threading
+from array import array
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class SourceCache:
+    """
+    Per-run cache of source files indexed by line offsets.
+
+    Each file is memory mapped once and its line start offsets are computed once,
+    so repeated line lookups do not re-read the file. Callers that rewrite a file
+    must call invalidate, and clear after anything that rewrites the work tree.
+    """
+    def __init__(self, encoding='utf-8'):
+        self.encoding = encoding
+        self.lock = threading.Lock()
+        self._files = {}
+
+    def _load(self, file_path):
+        with open(file_path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        offsets = array('Q', [0])
+        position = data.find(b'\n')
+        while position != -1:
+            offsets.append(position + 1)
+            position = data.find(b'\n', position + 1)
+        # A trailing newline does not start another line
+        if offsets[-1] == size and len(offsets) > 1:
+            offsets.pop()
+        elif size == 0:
+            offsets = array('Q')
+        return data, size, offsets
+
+    def _entry(self, file_path):
+        key = os.path.abspath(file_path)
+        with self.lock:
+            entry = self._files.get(key)
+            if entry is None:
+                entry = self._load(file_path)
+                self._files[key] = entry
+            return entry
+
+    def line_count(self, file_path):
+        return len(self._entry(file_path)[2])
+
+    def get_line(self, file_path, line_number):
+        """
+        Returns line line_number (1-based) without its line terminator, or None if the file is shorter.
+        """
+        data, size, offsets = self._entry(file_path)
+        if line_number < 1 or line_number > len(offsets):
+            return None
+        start = offsets[line_number - 1]
+        end = offsets[line_number] if line_number < len(offsets) else size
+        return data[start:end].decode(self.encoding, errors='replace').rstrip('\r\n')
+
+    def invalidate(self, file_path):
+        with self.lock:
+            entry = self._files.pop(os.path.abspath(file_path), None)
+        if entry is not None:
+            self._close(entry)
+
+    def clear(self):
+        with self.lock:
+            entries = list(self._files.values())
+            self._files.clear()
+        for entry in entries:
+            self._close(entry)
+
+    @staticmethod
+    def _close(entry):
+        data = entry[0]
+        if isinstance(data, mmap.mmap):
+            data.close()
@@ -0,0 +1,44 @@
+import numbers
+
+def markdown_table(records):
+    """
+    Renders records as a GitHub markdown pipe table, laid out like pandas
+    DataFrame.to_markdown(index=False) so reports keep their format without pandas.
+
+    Columns are the keys of the first record. Numeric columns are right-aligned,
+    all others left-aligned, and missing values are left empty.
+
+    Args:
+        records (list): Dicts mapping column name to cell value.
+
+    Returns:
+        str: The table, or an empty string when there are no records.
+    """
+    if not records:
+        return ""
+    columns = list(records[0])
+    cells = [["" if record.get(column) is None else str(record.get(column)) for column in columns] for record in records]
+    numeric = [
+        all(
+            isinstance(record.get(column), numbers.Number) and not isinstance(record.get(column), bool)
+            for record in records if record.get(column) is not None
+        ) and any(record.get(column) is not None for record in records)
+        for column in columns
+    ]
+    # Headers get two extra characters, like tabulate's pipe format
+    widths = [
+        max([len(str(column)) + 2] + [len(row[index]) for row in cells])
+        for index, column in enumerate(columns)
+    ]
+
+    def format_row(values):
+        return "| " + " | ".join(
+            value.rjust(width) if right else value.ljust(width)
+            for value, width, right in zip(values, widths, numeric)
+        ) + " |"
+
+    separator = "|" + "|".join(
+        "-" * (width + 1) + ":" if right else ":" + "-" * (width + 1)
+        for width, right in zip(widths, numeric)
+    ) + "|"
+    return "\n".join([format_row([str(column) for column in columns]), separator] + [format_row(row) for row in cells])
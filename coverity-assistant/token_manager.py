@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows hosts fall back to an unlocked cache
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_TOKEN_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'coverity-assistant', 'tokens.json')
+
+class TokenManager:
+    """
+    Thread-safe OAuth access token holder shared by concurrent jobs on the same host.
+
+    Tokens are persisted to a locked JSON cache file so a new process can reuse a
+    token fetched by another one, and a background thread refreshes the token
+    refresh_margin seconds before it expires, or halfway through its lifetime for
+    tokens living less than twice the margin. get_token only blocks on the auth
+    endpoint when no valid token exists at all.
+    """
+    def __init__(self, fetch_token, cache_id, cache_path=None, refresh_margin=300, retry_interval=30):
+        """
+        Args:
+            fetch_token (callable): Returns a tuple (access_token, expires_on) from the auth endpoint.
+            cache_id (str): Identifies the credentials, e.g. auth URL and client id. Secrets are never stored.
+            cache_path (str): Location of the shared token cache file.
+            refresh_margin (int): Seconds before expiry at which the background refresh kicks in.
+            retry_interval (int): Seconds to wait before retrying a failed background refresh, also
+                the shortest delay between two background refreshes.
+        """
+        self.fetch_token = fetch_token
+        self.cache_key = hashlib.sha256(cache_id.encode('utf-8')).hexdigest()
+        self.cache_path = cache_path if cache_path else DEFAULT_TOKEN_CACHE
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.access_token = None
+        self.access_token_expires_on = None
+        self.access_token_obtained_on = None
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.refresh_thread = None
+
+    def get_token(self):
+        with self.lock:
+            if self.access_token and self.access_token_expires_on > time.time():
+                self._start_refresh_thread()
+                return self.access_token
+        self.refresh(force=False)
+        with self.lock:
+            self._start_refresh_thread()
+            return self.access_token
+
+    def refresh(self, force=True):
+        """
+        Loads a still valid token from the shared cache or fetches a new one.
+
+        Args:
+            force (bool): Fetch a new token even if the cached one has not reached the refresh margin.
+        """
+        with self.refresh_lock:
+            with self._locked_cache() as cache:
+                entry = cache.get(self.cache_key)
+                now = time.time()
+                # Entries written before obtained_on was recorded count as obtained now
+                obtained_on = entry.get("obtained_on", now) if entry else None
+                if not force and entry and entry["expires_on"] - self._margin(entry["expires_on"], obtained_on) > now:
+                    logging.info("Reusing access token from the shared token cache.")
+                    access_token, expires_on = entry["access_token"], entry["expires_on"]
+                else:
+                    obtained_on = time.time()
+                    access_token, expires_on = self.fetch_token()
+                    cache[self.cache_key] = {"access_token": access_token, "expires_on": expires_on, "obtained_on": obtained_on}
+                    self._write_cache(cache)
+            with self.lock:
+                self.access_token = access_token
+                self.access_token_expires_on = expires_on
+                self.access_token_obtained_on = obtained_on
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _start_refresh_thread(self):
+        if self.refresh_thread is None or not self.refresh_thread.is_alive():
+            self.refresh_thread = threading.Thread(target=self._refresh_loop, name="token-refresh", daemon=True)
+            self.refresh_thread.start()
+
+    def _refresh_loop(self):
+        delay = self._seconds_until_refresh()
+        while not self.stop_event.wait(delay):
+            try:
+                self.refresh(force=False)
+                delay = self._seconds_until_refresh()
+            except Exception as e:
+                logging.error(f"Background access token refresh failed: {e}")
+                delay = self.retry_interval
+
+    def _margin(self, expires_on, obtained_on):
+        # A margin longer than the token's lifetime would make every token look stale at once
+        return min(self.refresh_margin, max(0, expires_on - obtained_on) / 2)
+
+    def _seconds_until_refresh(self):
+        with self.lock:
+            expires_on = self.access_token_expires_on or 0
+            obtained_on = self.access_token_obtained_on or time.time()
+        return max(self.retry_interval, expires_on - self._margin(expires_on, obtained_on) - time.time())
+
+    def _locked_cache(self):
+        return _CacheLock(self.cache_path)
+
+    def _write_cache(self, cache):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.cache_path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as cache_file:
+                json.dump(cache, cache_file)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logging.error(f"Failed to write token cache {self.cache_path}: {e}")
+
+class _CacheLock:
+    """
+    Holds an exclusive lock on the token cache for the duration of a with block.
+    """
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.lock_file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        self.lock_file = open(f"{self.cache_path}.lock", 'a')
+        if fcntl:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            with open(self.cache_path, 'r') as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if fcntl:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock_file.close()
+        return False
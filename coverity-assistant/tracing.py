@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import itertools
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+METRIC_PREFIX = "coverity_assistant"
+
+class Tracer:
+    """
+    Collects nested timing spans and counters of one scan run.
+
+    Spans nest per thread: a span opened while another one is open on the same
+    thread becomes its child. Every span has a category (coverity, llm, bookkeeping,
+    git, github) used for the stage breakdown. The trace is written in the Chrome
+    trace event format and the metrics as a Prometheus textfile.
+
+    Counters are keyed by name and labels, e.g. count("llm_response_bytes", 512, endpoint="gpt").
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.start_counter = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.ids = itertools.count(1)
+        self.local = threading.local()
+
+    @contextmanager
+    def span(self, name, category, **attributes):
+        """
+        Times the enclosed block. The yielded attributes dict can be extended inside
+        the block, e.g. with the size of a response.
+        """
+        stack = self.local.__dict__.setdefault("stack", [])
+        span_id = next(self.ids)
+        parent_id = stack[-1] if stack else None
+        stack.append(span_id)
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            stack.pop()
+            self._add_span(span_id, parent_id, name, category, start, time.perf_counter() - start, attributes)
+
+    def record(self, name, category, duration, **attributes):
+        """
+        Adds a span for work that just finished and was timed by the caller.
+        """
+        stack = self.local.__dict__.setdefault("stack", [])
+        self._add_span(
+            next(self.ids), stack[-1] if stack else None, name, category,
+            time.perf_counter() - duration, duration, attributes
+        )
+
+    def _add_span(self, span_id, parent_id, name, category, start, duration, attributes):
+        with self.lock:
+            self.spans.append({
+                "id": span_id,
+                "parent": parent_id,
+                "name": name,
+                "category": category,
+                "thread": threading.get_ident(),
+                "start": start - self.start_counter,
+                "duration": duration,
+                "attributes": attributes
+            })
+
+    def traced_iter(self, iterable, name, category, **attributes):
+        """
+        Yields the items of iterable, timing the production of each item as its own span
+        so the consumer's work between items is not included.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.span(name, category, **attributes):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_counter
+
+    def breakdown(self):
+        """
+        Returns {category: {"spans": n, "seconds": wall time}} where the wall time is the
+        union of the category's spans, so nested spans and spans running in parallel
+        threads are not counted twice. Categories overlap where their spans nest, e.g.
+        applying fixes (bookkeeping) inside a workspace reset (git).
+        """
+        with self.lock:
+            spans = list(self.spans)
+        intervals = {}
+        for span in spans:
+            intervals.setdefault(span["category"], []).append((span["start"], span["start"] + span["duration"]))
+        result = {}
+        for category, category_intervals in intervals.items():
+            seconds = 0.0
+            covered_until = None
+            for start, end in sorted(category_intervals):
+                if covered_until is None or start > covered_until:
+                    seconds += end - start
+                    covered_until = end
+                elif end > covered_until:
+                    seconds += end - covered_until
+                    covered_until = end
+            result[category] = {"spans": len(category_intervals), "seconds": seconds}
+        return result
+
+    def span_totals(self):
+        """
+        Returns {(category, name): {"spans": n, "seconds": summed duration}}.
+        """
+        with self.lock:
+            spans = list(self.spans)
+        totals = {}
+        for span in spans:
+            entry = totals.setdefault((span["category"], span["name"]), {"spans": 0, "seconds": 0.0})
+            entry["spans"] += 1
+            entry["seconds"] += span["duration"]
+        return totals
+
+    def write_trace(self, trace_file, extra_counters=None):
+        """
+        Writes the spans as Chrome trace events, viewable in chrome://tracing or Perfetto.
+        """
+        with self.lock:
+            spans = list(self.spans)
+            counters = self._counter_list(extra_counters)
+        trace = {
+            "traceEvents": [
+                {
+                    "name": span["name"],
+                    "cat": span["category"],
+                    "ph": "X",
+                    "ts": span["start"] * 1e6,
+                    "dur": span["duration"] * 1e6,
+                    "pid": os.getpid(),
+                    "tid": span["thread"],
+                    "args": dict(span["attributes"], span_id=span["id"], parent_id=span["parent"])
+                }
+                for span in spans
+            ],
+            "displayTimeUnit": "ms",
+            "otherData": {"start_time": self.start_time, "counters": counters}
+        }
+        self._write_atomic(trace_file, json.dumps(trace, default=str))
+        logging.info(f"Trace written to {trace_file}")
+
+    def write_prometheus(self, metrics_file, extra_counters=None):
+        """
+        Writes the stage breakdown and counters in the Prometheus textfile collector format.
+        """
+        with self.lock:
+            counters = self._counter_list(extra_counters)
+        # A textfile describes one run, so every metric is a gauge of that run
+        lines = [
+            f"# HELP {METRIC_PREFIX}_run_seconds Wall time of the last scan run.",
+            f"# TYPE {METRIC_PREFIX}_run_seconds gauge",
+            f"{METRIC_PREFIX}_run_seconds {self.elapsed():.6f}",
+            f"# HELP {METRIC_PREFIX}_stage_seconds Wall time of the last scan run spent in each stage.",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds gauge"
+        ]
+        for category, entry in sorted(self.breakdown().items()):
+            lines.append(_metric_line("stage_seconds", {"stage": category}, f"{entry['seconds']:.6f}"))
+        span_totals = sorted(self.span_totals().items())
+        lines.append(f"# HELP {METRIC_PREFIX}_span_seconds Summed duration of the spans of each name in the last scan run.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_span_seconds gauge")
+        for (category, name), entry in span_totals:
+            lines.append(_metric_line("span_seconds", {"stage": category, "span": name}, f"{entry['seconds']:.6f}"))
+        lines.append(f"# HELP {METRIC_PREFIX}_spans Number of spans of each name in the last scan run.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_spans gauge")
+        for (category, name), entry in span_totals:
+            lines.append(_metric_line("spans", {"stage": category, "span": name}, entry["spans"]))
+        for name in sorted({counter["name"] for counter in counters}):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            for counter in counters:
+                if counter["name"] == name:
+                    lines.append(_metric_line(name, counter["labels"], counter["value"]))
+        self._write_atomic(metrics_file, "\n".join(lines) + "\n")
+        logging.info(f"Metrics written to {metrics_file}")
+
+    def _counter_list(self, extra_counters):
+        counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.counters.items()]
+        for name, value in (extra_counters or {}).items():
+            counters.append({"name": name, "labels": {}, "value": value})
+        return counters
+
+    @staticmethod
+    def _write_atomic(path, content):
+        # Readers such as the node exporter must never see a partial file
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+def _metric_line(name, labels, value):
+    labels = ",".join(f'{label}="{_escape_label(label_value)}"' for label, label_value in sorted(labels.items()))
+    return f"{METRIC_PREFIX}_{name}{{{labels}}} {value}" if labels else f"{METRIC_PREFIX}_{name} {value}"
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+tracer = Tracer()
+
+def span(name, category, **attributes):
+    return tracer.span(name, category, **attributes)
+
+def record(name, category, duration, **attributes):
+    tracer.record(name, category, duration, **attributes)
+
+def traced_iter(iterable, name, category, **attributes):
+    return tracer.traced_iter(iterable, name, category, **attributes)
+
+def count(name, value=1, **labels):
+    tracer.count(name, value, **labels)